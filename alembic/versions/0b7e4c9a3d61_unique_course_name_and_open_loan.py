@@ -0,0 +1,35 @@
+"""unique course names and one open loan per student and book
+
+Revision ID: 0b7e4c9a3d61
+Revises: f3b8e1d6a972
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7e4c9a3d61'
+down_revision: Union[str, None] = 'f3b8e1d6a972'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if duplicates exist; create_course and issue_book already rejected them
+    op.create_unique_constraint('courses_name_key', 'courses', ['name'])
+    op.create_index(
+        'uq_issued_books_open_loan',
+        'issued_books',
+        ['book_id', 'student_id'],
+        unique=True,
+        postgresql_where=sa.text('is_returned = false'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_issued_books_open_loan', table_name='issued_books')
+    op.drop_constraint('courses_name_key', 'courses', type_='unique')
@@ -0,0 +1,149 @@
+"""partition issued_books by month of issue_date
+
+Revision ID: 2f6a8d1c4e93
+Revises: 9d4b6e2a7c15
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6a8d1c4e93'
+down_revision: Union[str, None] = '9d4b6e2a7c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months created ahead of today; app/utils/partitions.py keeps this up
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, issue_date, due_date, return_date, is_returned, last_reminder_at, student_id, book_id'
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _create_indexes(open_loan_unique: bool) -> None:
+    op.create_index(
+        'ix_issued_books_open_due_date',
+        'issued_books',
+        ['due_date', 'id'],
+        unique=False,
+        postgresql_where=sa.text('is_returned = false'),
+    )
+    op.create_index('ix_issued_books_issue_date', 'issued_books', ['issue_date'], unique=False)
+    op.create_index(
+        'uq_issued_books_open_loan' if open_loan_unique else 'ix_issued_books_open_loan',
+        'issued_books',
+        ['book_id', 'student_id'],
+        unique=open_loan_unique,
+        postgresql_where=sa.text('is_returned = false'),
+    )
+    op.create_index(
+        'ix_issued_books_student_issue_date',
+        'issued_books',
+        ['student_id', sa.text('issue_date DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_include=['book_id', 'due_date', 'return_date', 'is_returned'],
+    )
+
+
+def _drop_indexes(table: str, open_loan: str) -> None:
+    for name in (
+        'ix_issued_books_open_due_date',
+        'ix_issued_books_issue_date',
+        open_loan,
+        'ix_issued_books_student_issue_date',
+    ):
+        op.drop_index(name, table_name=table)
+
+
+def upgrade() -> None:
+    # Index and primary key names are schema-wide, so the old table gives them up first
+    op.execute('ALTER TABLE issued_books RENAME TO issued_books_unpartitioned')
+    _drop_indexes('issued_books_unpartitioned', 'uq_issued_books_open_loan')
+    op.drop_constraint('issued_books_pkey', 'issued_books_unpartitioned', type_='primary')
+    # A foreign key to a partitioned table must cover the partition key; fines
+    # keep their unique issued_book_id and lose the constraint instead
+    op.drop_constraint('fines_issued_book_id_fkey', 'fines', type_='foreignkey')
+
+    # Unique constraints must include issue_date too, so the primary key
+    # becomes (id, issue_date) and one-open-loan-per-book is enforced by
+    # issue_book instead of uq_issued_books_open_loan
+    op.execute(
+        """
+        CREATE TABLE issued_books (
+            id UUID NOT NULL,
+            issue_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            due_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            return_date TIMESTAMP WITHOUT TIME ZONE,
+            is_returned BOOLEAN,
+            last_reminder_at TIMESTAMP WITHOUT TIME ZONE,
+            student_id UUID NOT NULL REFERENCES users (id),
+            book_id UUID NOT NULL REFERENCES books (id),
+            CONSTRAINT issued_books_pkey PRIMARY KEY (id, issue_date)
+        ) PARTITION BY RANGE (issue_date)
+        """
+    )
+
+    oldest = op.get_bind().execute(
+        sa.text('SELECT min(issue_date) FROM issued_books_unpartitioned')
+    ).scalar()
+    today = datetime.utcnow().date()
+    start = oldest or today
+    month = date(start.year, start.month, 1)
+    last = date(today.year, today.month, 1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE issued_books_p{month:%Y_%m} PARTITION OF issued_books "
+            f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+        )
+        month = _next_month(month)
+    # Catches loans beyond the newest partition if maintenance falls behind
+    op.execute('CREATE TABLE issued_books_default PARTITION OF issued_books DEFAULT')
+
+    op.execute(
+        f'INSERT INTO issued_books ({COLUMNS}) SELECT {COLUMNS} FROM issued_books_unpartitioned'
+    )
+    op.drop_table('issued_books_unpartitioned')
+    _create_indexes(open_loan_unique=False)
+
+    # Detached partitions and the fines of their loans are moved here
+    op.execute('CREATE SCHEMA IF NOT EXISTS archive')
+    op.execute('CREATE TABLE archive.fines (LIKE fines INCLUDING ALL)')
+
+
+def downgrade() -> None:
+    # Loans and fines already archived stay in the archive schema
+    op.execute('ALTER TABLE issued_books RENAME TO issued_books_partitioned')
+    _drop_indexes('issued_books_partitioned', 'ix_issued_books_open_loan')
+    op.drop_constraint('issued_books_pkey', 'issued_books_partitioned', type_='primary')
+
+    op.create_table('issued_books',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('issue_date', sa.DateTime(), nullable=False),
+    sa.Column('due_date', sa.DateTime(), nullable=False),
+    sa.Column('return_date', sa.DateTime(), nullable=True),
+    sa.Column('is_returned', sa.Boolean(), nullable=True),
+    sa.Column('last_reminder_at', sa.DateTime(), nullable=True),
+    sa.Column('student_id', sa.UUID(), nullable=False),
+    sa.Column('book_id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id', name='issued_books_pkey')
+    )
+    op.execute(
+        f'INSERT INTO issued_books ({COLUMNS}) SELECT {COLUMNS} FROM issued_books_partitioned'
+    )
+    op.drop_table('issued_books_partitioned')
+    _create_indexes(open_loan_unique=True)
+    op.create_foreign_key(
+        'fines_issued_book_id_fkey', 'fines', 'issued_books', ['issued_book_id'], ['id']
+    )
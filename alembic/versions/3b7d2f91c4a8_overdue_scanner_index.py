@@ -0,0 +1,34 @@
+"""add overdue scanner index and reminder tracking
+
+Revision ID: 3b7d2f91c4a8
+Revises: e00c946f57ea
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d2f91c4a8'
+down_revision: Union[str, None] = 'e00c946f57ea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('issued_books', sa.Column('last_reminder_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_issued_books_open_due_date',
+        'issued_books',
+        ['due_date', 'id'],
+        unique=False,
+        postgresql_where=sa.text('is_returned = false'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_issued_books_open_due_date', table_name='issued_books')
+    op.drop_column('issued_books', 'last_reminder_at')
@@ -0,0 +1,66 @@
+"""add book holds queue
+
+Revision ID: 5e2c7a1f9b40
+Revises: 0b7e4c9a3d61
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2c7a1f9b40'
+down_revision: Union[str, None] = '0b7e4c9a3d61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('book_holds',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column(
+        'status',
+        sa.Enum('WAITING', 'READY', 'FULFILLED', 'CANCELLED', 'EXPIRED', name='holdstatusenum'),
+        nullable=False,
+    ),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('ready_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('student_id', sa.UUID(), nullable=False),
+    sa.Column('book_id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'uq_book_holds_active',
+        'book_holds',
+        ['book_id', 'student_id'],
+        unique=True,
+        postgresql_where=sa.text("status IN ('WAITING', 'READY')"),
+    )
+    op.create_index(
+        'ix_book_holds_queue',
+        'book_holds',
+        ['book_id', 'created_at', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status = 'WAITING'"),
+    )
+    op.create_index(
+        'ix_book_holds_ready_expires_at',
+        'book_holds',
+        ['expires_at'],
+        unique=False,
+        postgresql_where=sa.text("status = 'READY'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_book_holds_ready_expires_at', table_name='book_holds')
+    op.drop_index('ix_book_holds_queue', table_name='book_holds')
+    op.drop_index('uq_book_holds_active', table_name='book_holds')
+    op.drop_table('book_holds')
+    sa.Enum(name='holdstatusenum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""add claimed_at to idempotency keys
+
+Revision ID: 6a1d3e8b5f27
+Revises: 2f6a8d1c4e93
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a1d3e8b5f27'
+down_revision: Union[str, None] = '2f6a8d1c4e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('idempotency_keys', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE idempotency_keys SET claimed_at = created_at')
+    op.alter_column('idempotency_keys', 'claimed_at', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('idempotency_keys', 'claimed_at')
@@ -0,0 +1,32 @@
+"""add covering index for student loan history
+
+Revision ID: 9d4b6e2a7c15
+Revises: 5e2c7a1f9b40
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b6e2a7c15'
+down_revision: Union[str, None] = '5e2c7a1f9b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_issued_books_student_issue_date',
+        'issued_books',
+        ['student_id', sa.text('issue_date DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_include=['book_id', 'due_date', 'return_date', 'is_returned'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_issued_books_student_issue_date', table_name='issued_books')
@@ -0,0 +1,25 @@
+"""add issued_books issue_date index for exports
+
+Revision ID: c6d81e3f0b52
+Revises: a4f0c2b7e915
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6d81e3f0b52'
+down_revision: Union[str, None] = 'a4f0c2b7e915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_issued_books_issue_date', 'issued_books', ['issue_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_issued_books_issue_date', table_name='issued_books')
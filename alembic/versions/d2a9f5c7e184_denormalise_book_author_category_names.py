@@ -0,0 +1,41 @@
+"""denormalise author and category names onto books
+
+Revision ID: d2a9f5c7e184
+Revises: c6d81e3f0b52
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a9f5c7e184'
+down_revision: Union[str, None] = 'c6d81e3f0b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('author_name', sa.String(length=35), nullable=True))
+    op.add_column('books', sa.Column('category_name', sa.String(length=35), nullable=True))
+
+    # Backfill from the source tables, then enforce NOT NULL
+    op.execute(
+        "UPDATE books SET author_name = authors.name "
+        "FROM authors WHERE books.author_id = authors.id"
+    )
+    op.execute(
+        "UPDATE books SET category_name = categories.name "
+        "FROM categories WHERE books.category_id = categories.id"
+    )
+
+    op.alter_column('books', 'author_name', existing_type=sa.String(length=35), nullable=False)
+    op.alter_column('books', 'category_name', existing_type=sa.String(length=35), nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('books', 'category_name')
+    op.drop_column('books', 'author_name')
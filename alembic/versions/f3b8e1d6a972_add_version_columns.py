@@ -0,0 +1,33 @@
+"""add version columns for optimistic concurrency
+
+Revision ID: f3b8e1d6a972
+Revises: d2a9f5c7e184
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8e1d6a972'
+down_revision: Union[str, None] = 'd2a9f5c7e184'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('authors', 'categories', 'books', 'courses', 'users')
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+        )
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version')
@@ -0,0 +1,31 @@
+"""Production entry point: ``python -m app`` runs ``web_workers`` uvicorn workers."""
+import uvicorn
+
+from app.config import get_settings
+
+try:
+    import uvloop
+except ImportError:  # not available on Windows; the asyncio loop is used there
+    uvloop = None
+
+
+def main():
+    settings = get_settings()
+    # Workers inherit the environment, so each one sizes its pool from the
+    # same web_workers (app/database.py pool_limits)
+    uvicorn.run(
+        "app.main:app",
+        host=settings.web_host,
+        port=settings.web_port,
+        workers=settings.web_workers,
+        loop="uvloop" if uvloop is not None else "asyncio",
+        http="httptools",
+        backlog=settings.web_backlog,
+        timeout_keep_alive=settings.web_keepalive_seconds,
+        limit_concurrency=settings.web_limit_concurrency,
+        timeout_graceful_shutdown=settings.shutdown_drain_seconds,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -6,17 +7,11 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
-from app import database, models
+from app import database, queries
+from app.config import get_settings
+from app.utils.token_cache import revocation_list, token_cache, token_hash
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# JWT Config from .env
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+settings = get_settings()
 
 
 # Password hashing
@@ -39,9 +34,21 @@ class Hash:
 # JWT Token
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+
+
+# Verified payload of a token, from the cache or its signature; None if invalid
+def decode_token(token: str, key: str) -> Optional[dict]:
+    payload = token_cache.get(key)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        except JWTError:
+            return None
+        token_cache.put(key, payload)
+    return payload
 
 
 # Dependency to get current user
@@ -53,15 +60,34 @@ def get_current_user(
         detail="Invalid or expired token",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    key = token_hash(token)
+    payload = decode_token(token, key)
+    if payload is None:
+        raise credentials_exception
+
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    if revocation_list.is_revoked(db, key):
+        raise credentials_exception
+
+    user = queries.user_by_email(db, email)
     if user is None:
         raise credentials_exception
     return user
+
+
+# Revoke a token so it is rejected until it expires
+def revoke_token(token: str, db: Session):
+    key = token_hash(token)
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    token_cache.discard(key)
+    revocation_list.revoke(db, key, datetime.utcfromtimestamp(payload["exp"]))
+
+
+# Load the bcrypt backend up front instead of on the first login
+def warm_up_password_hashing():
+    pwd_context.handler("bcrypt").get_backend()
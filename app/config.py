@@ -0,0 +1,161 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import List, Optional
+from urllib.parse import quote_plus
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """All runtime configuration, read from the environment / ``.env`` once."""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # Database
+    db_name: Optional[str] = None
+    db_user: Optional[str] = None
+    db_password: str = ""
+    db_host: str = "localhost"
+    db_port: str = "5432"
+    database_url: Optional[str] = None
+    # Comma separated replica URLs; read-only handlers are spread across them
+    db_replica_urls: str = ""
+    replica_max_lag_seconds: float = 5
+    replica_lag_check_seconds: float = 2
+    # After a write, the same client reads from the primary for this long
+    read_after_write_seconds: int = 5
+    # Connections all workers together may hold on each database server; keep
+    # it below PostgreSQL's max_connections minus what other clients need.
+    # Split evenly across web_workers (see app/database.py pool_limits)
+    db_max_connections: int = 16
+
+    # Server (python -m app)
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = 1
+    # Connections the kernel queues while every worker is busy accepting
+    web_backlog: int = 2048
+    web_keepalive_seconds: int = 5
+    # Per worker; uvicorn answers 503 beyond this many open connections
+    web_limit_concurrency: Optional[int] = None
+
+    # Timeouts and circuit breakers (app/utils/circuit_breaker.py)
+    # PostgreSQL cancels statements running longer than this
+    db_statement_timeout_ms: int = 5000
+    # ... and statements waiting longer than this for a lock; routes can set
+    # tighter deadlines for both (app/utils/deadlines.py)
+    db_lock_timeout_ms: int = 2000
+    db_connect_timeout_seconds: int = 5
+    # How long a request waits for a pooled connection
+    db_pool_timeout_seconds: float = 5
+    email_timeout_seconds: float = 10
+    # Consecutive failures that open a breaker, and how long it stays open
+    # before a probe is let through
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30
+    # Catalog GET responses kept per worker and served, stale, while the
+    # database breaker is open
+    stale_cache_size: int = 1000
+    stale_cache_max_body_bytes: int = 262144
+
+    # JWT Authentication
+    secret_key: Optional[str] = None
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    token_cache_size: int = 10000
+    revocation_bloom_bits: int = 1 << 20
+    revocation_bloom_hashes: int = 7
+    revocation_sync_seconds: int = 5
+
+    # Email
+    email_host: Optional[str] = None
+    email_port: int = 587
+    email_user: Optional[str] = None
+    email_password: Optional[str] = None
+
+    # Overdue scanner
+    fine_per_day: Decimal = Decimal(10)
+    overdue_scan_interval_seconds: int = 3600
+    overdue_scan_batch_size: int = 500
+
+    # Loan partitions (PostgreSQL)
+    # Monthly issued_books partitions created ahead of the current month
+    partition_months_ahead: int = 3
+    # Partitions older than this are detached into the archive schema
+    loan_archive_after_months: int = 24
+    loan_archive_tablespace: Optional[str] = None
+    partition_maintenance_interval_seconds: int = 86400
+    # How long partition maintenance waits for its ACCESS EXCLUSIVE locks;
+    # its statements have no statement_timeout
+    partition_lock_timeout_ms: int = 60000
+
+    # Hold queue
+    # How long a copy allocated to a hold stays set aside before it passes on
+    hold_pickup_hours: int = 48
+    hold_expiry_interval_seconds: int = 300
+
+    # Recommendations ("borrowed together")
+    # Neighbours precomputed per book; also the most a request can ask for
+    recommendation_top_k: int = 20
+    recommendation_refresh_seconds: int = 300
+
+    # Reference data (categories, courses) held in memory per worker
+    # Reloaded at least this often, in case a change notification was missed
+    reference_data_max_age_seconds: int = 300
+
+    # Rate limiting / admission control
+    rate_limit_capacity: float = 60
+    rate_limit_refill_per_second: float = 1
+    rate_limit_redis_url: Optional[str] = None
+    # Defaults to this worker's pool size + overflow, so excess requests are
+    # shed instead of queueing on the connection pool.
+    max_concurrent_requests: Optional[int] = None
+
+    # Response encoding
+    # Responses smaller than this are sent uncompressed
+    compression_minimum_size: int = 1000
+    # Rows fetched per round trip when streaming NDJSON / MessagePack lists
+    stream_batch_size: int = 500
+
+    # Availability feed (server-sent events)
+    # Changes to a title within this window are sent as one event
+    availability_coalesce_seconds: float = 0.25
+    sse_keepalive_seconds: float = 15
+    # Streams are closed after this long and the client reconnects
+    sse_max_connection_seconds: int = 300
+
+    # Idempotency keys
+    idempotency_key_ttl_hours: int = 24
+    # A key claimed this long ago with no stored response is taken over by a
+    # retry (the worker handling it crashed); keep above the slowest request
+    idempotency_claim_lease_seconds: int = 60
+
+    # Startup / shutdown
+    # Import and mount routers in the lifespan handler instead of at import time
+    lazy_routers: bool = False
+    # Connections opened per engine at startup so first requests skip connect()
+    db_pool_prewarm: int = 5
+    # Upper bound on waiting for in-flight requests and queued emails at shutdown
+    shutdown_drain_seconds: float = 10
+
+    # Per-route SQL statement budgets (app/utils/query_budget.py):
+    # "off", "warn" (log + X-Query-Count header) or "enforce" (500 when exceeded)
+    query_budget_mode: str = "off"
+
+    @property
+    def sqlalchemy_url(self) -> str:
+        if self.database_url:
+            return self.database_url
+        return (
+            f"postgresql://{self.db_user}:{quote_plus(self.db_password)}"
+            f"@{self.db_host}:{self.db_port}/{self.db_name}"
+        )
+
+    @property
+    def replica_urls(self) -> List[str]:
+        return [url.strip() for url in self.db_replica_urls.split(",") if url.strip()]
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
@@ -1,32 +1,301 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
-from urllib.parse import quote_plus
+import itertools
+import logging
+import math
+import time
+from fastapi import HTTPException, Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
-load_dotenv()
+from app.config import get_settings
+from app.utils.background import PeriodicJob
+from app.utils.circuit_breaker import CircuitOpenError, db_breaker
+from app.utils.deadlines import apply_deadline, cancelled_by_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+# POST routes that only read, so they don't pin the client to the primary
+READ_ONLY_POST_PATHS = {"/authors/batch", "/books/batch", "/users/batch"}
 
 
 class Base(DeclarativeBase):
     pass
 
-# Extract and encode DB credentials
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = quote_plus(os.getenv("DB_PASSWORD"))
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME")
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Created by get_engine(), normally from the application lifespan, so importing
+# the models or routers never opens a pool
+engine = None
+SessionLocal = sessionmaker(autoflush=False, autocommit=False)
 
+# SQLSTATE of a statement cancelled by statement_timeout or a cancel request
+QUERY_CANCELED = "57014"
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+def check_primary(request: Request):
+    """
+    Fail fast with 503 while the primary's circuit breaker is open. Checked
+    once per request, so a half-open probe can use several sessions.
+    """
+    if getattr(request.state, "primary_admitted", False):
+        return
+    try:
+        db_breaker.before_call()
+    except CircuitOpenError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="Database is unavailable; retry later",
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        )
+    request.state.primary_admitted = True
 
 
-def get_db():
+def _primary_session(request: Request):
+    """
+    The request's session on the primary and whether this call opened it.
+    get_db and get_read_db share it, so a request that authenticates and
+    reads from the primary holds one pooled connection, not two.
+    """
+    db = getattr(request.state, "primary_db", None)
+    if db is not None:
+        return db, False
+    check_primary(request)
     db = SessionLocal()
+    apply_deadline(db, request.scope)
+    request.state.primary_db = db
+    return db, True
+
+
+def _close_session(request: Request, db: Session):
+    if getattr(request.state, "primary_db", None) is db:
+        request.state.primary_db = None
+    db.close()
+
+
+def get_db(request: Request):
+    db, opened = _primary_session(request)
     try:
         yield db
     finally:
-        db.close()
+        if opened:
+            _close_session(request, db)
+
+
+def pool_limits():
+    """
+    ``(pool_size, max_overflow)`` for each engine of this worker process.
+
+    Every worker gets an equal share of ``db_max_connections``, less the
+    connection held by its notification listener, so all workers together
+    stay under the budget. A share of 15 gives SQLAlchemy's defaults, 5 + 10.
+    """
+    share = max(settings.db_max_connections // settings.web_workers - 1, 1)
+    pool_size = max(share // 3, 1)
+    return pool_size, share - pool_size
+
+
+def _create_engine(url: str):
+    pool_size, max_overflow = pool_limits()
+    connect_args = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        connect_args = {
+            "connect_timeout": settings.db_connect_timeout_seconds,
+            "options": (
+                f"-c statement_timeout={settings.db_statement_timeout_ms} "
+                f"-c lock_timeout={settings.db_lock_timeout_ms}"
+            ),
+        }
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        connect_args=connect_args,
+    )
+
+
+def _is_outage(context) -> bool:
+    """Lost connections, failed connects and timed-out statements; not constraint errors."""
+    if context.is_disconnect:
+        return True
+    error = context.original_exception
+    code = getattr(error, "pgcode", None)
+    if code is not None:
+        # Statements cancelled because the client went away say nothing about the database
+        return code == QUERY_CANCELED and not cancelled_by_client()
+    dbapi = context.dialect.dbapi
+    return dbapi is not None and isinstance(error, dbapi.OperationalError)
+
+
+def _watch_primary(target):
+    @event.listens_for(target, "after_cursor_execute")
+    def _succeeded(conn, cursor, statement, parameters, context, executemany):
+        db_breaker.record_success()
+
+    @event.listens_for(target, "handle_error")
+    def _failed(context):
+        if _is_outage(context):
+            db_breaker.record_failure()
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.engine = _create_engine(url)
+        self.available = True
+
+    def check_lag(self):
+        """Mark the replica unavailable when it is unreachable or too far behind."""
+        if self.engine.dialect.name != "postgresql":
+            self.available = True
+            return
+        try:
+            with self.engine.connect() as conn:
+                lag = conn.execute(
+                    text(
+                        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                    )
+                ).scalar()
+        except Exception:
+            logger.warning("Replica %s is unreachable", self.engine.url, exc_info=True)
+            self.available = False
+            return
+        self.available = lag is None or lag <= settings.replica_max_lag_seconds
+
+
+class ReplicaRouter:
+    """Round-robin over healthy replicas, falling back to the primary."""
+
+    def __init__(self):
+        self.replicas = []
+        self._cycle = None
+
+    def configure(self, urls: list):
+        self.replicas = [Replica(url) for url in urls]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+
+    def check_replicas(self):
+        for replica in self.replicas:
+            replica.check_lag()
+
+    def read_engine(self):
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.available:
+                return replica.engine
+        return engine
+
+
+replica_router = ReplicaRouter()
+replica_lag_check = PeriodicJob(
+    "replica-lag-check",
+    replica_router.check_replicas,
+    settings.replica_lag_check_seconds,
+)
+
+
+def get_engine():
+    global engine
+    if engine is None:
+        engine = _create_engine(settings.sqlalchemy_url)
+        _watch_primary(engine)
+        SessionLocal.configure(bind=engine)
+        replica_router.configure(settings.replica_urls)
+    return engine
+
+
+def _reads_own_writes(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def prewarm_pool(count: int):
+    """Open ``count`` connections on the primary and every replica, then return them to the pool."""
+    for target in [get_engine()] + [replica.engine for replica in replica_router.replicas]:
+        pool_size = getattr(target.pool, "size", None)
+        if callable(pool_size):
+            count = min(count, pool_size())
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(target.connect())
+        except Exception:
+            logger.warning("Could not pre-warm pool for %s", target.url, exc_info=True)
+        finally:
+            for conn in connections:
+                conn.close()
+
+
+def dispose_engines():
+    global engine
+    for replica in replica_router.replicas:
+        replica.engine.dispose()
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+
+def _read_engine(request: Request):
+    return engine if _reads_own_writes(request) else replica_router.read_engine()
+
+
+def read_session(request: Request) -> Session:
+    """A new session for reads that outlive the handler's dependencies, e.g. a streamed body."""
+    target = _read_engine(request)
+    if target is engine:
+        check_primary(request)
+    db = SessionLocal(bind=target)
+    apply_deadline(db, request.scope)
+    return db
+
+
+# Session for read-only handlers; may be served by a replica, else shares get_db's
+def get_read_db(request: Request):
+    target = _read_engine(request)
+    if target is engine:
+        db, opened = _primary_session(request)
+    else:
+        db, opened = SessionLocal(bind=target), True
+        apply_deadline(db, request.scope)
+    try:
+        yield db
+    finally:
+        if opened:
+            _close_session(request, db)
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a successful write, pin the client to the primary for
+    ``read_after_write_seconds`` so it never reads a replica that is behind.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not replica_router.replicas
+            or scope["method"] in ("GET", "HEAD", "OPTIONS")
+            or scope["path"] in READ_ONLY_POST_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                window = settings.read_after_write_seconds
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={int(time.time()) + window}; Max-Age={window}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode("latin-1"))
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,8 +1,128 @@
+import importlib
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy.orm import configure_mappers
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+from app.database import (
+    ReadYourWritesMiddleware,
+    dispose_engines,
+    get_engine,
+    prewarm_pool,
+    replica_lag_check,
+    replica_router,
+)
+from app.utils.deadlines import DisconnectCancelMiddleware
+from app.utils.idempotency import IdempotencyMiddleware, idempotency_purge
+from app.utils.negotiation import CompressionMiddleware
+from app.utils.query_budget import QueryBudgetMiddleware
+from app.utils.rate_limit import AdmissionControlMiddleware, in_flight
+from app.utils.stale_cache import StaleCatalogMiddleware
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Mounted in this order; imported lazily when settings.lazy_routers is set
+ROUTER_MODULES = (
+    "user",
+    "author",
+    "category",
+    "course",
+    "book",
+    "issued_book",
+    "hold",
+    "export",
+)
+
+
+def include_routers(app: FastAPI):
+    for name in ROUTER_MODULES:
+        module = importlib.import_module(f"app.routers.{name}")
+        app.include_router(module.router)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only the middlewares are imported with the app; the background jobs,
+    # and what they pull in (numpy, the SSE hub, the hold queue), load here
+    from app.auth import warm_up_password_hashing
+    from app.utils.availability import availability_hub
+    from app.utils.email_service import flush_email_queue
+    from app.utils.holds import hold_expiry
+    from app.utils.notify import pg_listener
+    from app.utils.overdue import overdue_scanner
+    from app.utils.partitions import partition_maintenance
+    from app.utils.recommendations import np, recommendation_refresh
+    from app.utils.reference_data import load_reference_data
+    from app.utils.token_cache import revocation_sync, sync_revocation_list
+
+    get_engine()
+    warm_up_password_hashing()
+    if settings.lazy_routers:
+        include_routers(app)
+
+    # Pay one-off costs before the first request instead of during it
+    configure_mappers()
+    await run_in_threadpool(prewarm_pool, settings.db_pool_prewarm)
+    try:
+        await run_in_threadpool(sync_revocation_list)
+    except Exception:
+        logger.warning("Initial revocation list sync failed", exc_info=True)
+    try:
+        await run_in_threadpool(load_reference_data)
+    except Exception:
+        logger.warning("Initial reference data load failed", exc_info=True)
+
+    pg_listener.start()
+    overdue_scanner.start()
+    partition_maintenance.start()
+    hold_expiry.start()
+    if np is not None:
+        recommendation_refresh.start()
+    revocation_sync.start()
+    idempotency_purge.start()
+    if replica_router.replicas:
+        replica_lag_check.start()
+
+    yield
+
+    # Drain in order: requests, then the jobs and mail they may have queued, then the pool
+    availability_hub.close_all()
+    if not await in_flight.drain(settings.shutdown_drain_seconds):
+        logger.warning("Shutting down with %s requests still in flight", in_flight.count)
+    for job in (
+        pg_listener,
+        overdue_scanner,
+        partition_maintenance,
+        hold_expiry,
+        recommendation_refresh,
+        revocation_sync,
+        idempotency_purge,
+        replica_lag_check,
+    ):
+        await run_in_threadpool(job.stop, 5)
+    if not await run_in_threadpool(flush_email_queue, settings.shutdown_drain_seconds):
+        logger.warning("Shutting down with unsent emails in the queue")
+    await run_in_threadpool(dispose_engines)
 
-from app.routers import author, book, category, course, issued_book, user
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+if settings.query_budget_mode != "off":
+    # Innermost, so only the handler's own queries count against its budget
+    app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+# Inside compression, so cached catalog bodies are stored uncompressed
+app.add_middleware(StaleCatalogMiddleware)
+# Outside idempotency so stored responses are kept uncompressed
+app.add_middleware(CompressionMiddleware)
+# Outside idempotency, which reads the body itself, so it sees the whole request
+app.add_middleware(DisconnectCancelMiddleware)
+# Added last so it runs first and sheds load before any other work
+app.add_middleware(AdmissionControlMiddleware)
 
 
 @app.get("/")
@@ -11,9 +131,5 @@ def read_root():
 
 
 # include router
-app.include_router(user.router)
-app.include_router(author.router)
-app.include_router(category.router)
-app.include_router(course.router)
-app.include_router(book.router)
-app.include_router(issued_book.router)
+if not settings.lazy_routers:
+    include_routers(app)
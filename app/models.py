@@ -9,13 +9,25 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     Numeric,
     String,
     Text,
+    event,
+    inspect,
+    text,
+    update,
 )
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import (
+    Mapped,
+    Session,
+    attributes,
+    mapped_column,
+    relationship,
+)
 
 from .database import Base
 
@@ -34,6 +46,10 @@ class Author(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
     )
+    # Bumped by every conditional update (app/utils/concurrency.py); sent as the ETag
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1"
+    )
 
     books: Mapped[List["Book"]] = relationship(back_populates="author")
 
@@ -49,6 +65,9 @@ class Category(Base):
     )
     name: Mapped[str] = mapped_column(String(35), nullable=False, unique=True)
     description: Mapped[str] = mapped_column(Text, nullable=False)
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1"
+    )
 
     books: Mapped[List["Book"]] = relationship(back_populates="category")
 
@@ -74,10 +93,18 @@ class Book(Base):
     category_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("categories.id"), nullable=False
     )
+    # Copies of authors.name / categories.name so catalog reads need no joins;
+    # kept in sync by sync_denormalised_book_names below
+    author_name: Mapped[str] = mapped_column(String(35), nullable=False)
+    category_name: Mapped[str] = mapped_column(String(35), nullable=False)
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1"
+    )
 
     author: Mapped["Author"] = relationship(back_populates="books")
     category: Mapped["Category"] = relationship(back_populates="books")
     issued_books: Mapped[List["IssuedBook"]] = relationship(back_populates="book")
+    holds: Mapped[List["BookHold"]] = relationship(back_populates="book")
 
     def __repr__(self):
         return f"<Book(id={self.id}, title='{self.title}', quantity={self.quantity})>"
@@ -96,9 +123,12 @@ class Course(Base):
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
-    name: Mapped[str] = mapped_column(String(50), nullable=False)
+    name: Mapped[str] = mapped_column(String(50), nullable=False, unique=True)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     year: Mapped[YearEnum] = mapped_column(Enum(YearEnum), nullable=False)
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1"
+    )
     students: Mapped[List["User"]] = relationship(back_populates="course")
 
     def __repr__(self):
@@ -143,6 +173,9 @@ class User(Base):
     course_id: Mapped[Optional[uuid.UUID]] = mapped_column(
         UUID(as_uuid=True), ForeignKey("courses.id"), nullable=True
     )
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1"
+    )
 
     course: Mapped[Optional["Course"]] = relationship(back_populates="students")
     issued_books: Mapped[List["IssuedBook"]] = relationship(back_populates="student")
@@ -152,17 +185,52 @@ class User(Base):
 
 
 class IssuedBook(Base):
+    # In PostgreSQL this table is range-partitioned by month of issue_date
+    # (see app/utils/partitions.py) and its primary key is (id, issue_date).
+    # Unique indexes there must include issue_date, so none below are unique.
     __tablename__ = "issued_books"
+    __table_args__ = (
+        # Partial index used by the overdue scanner to range-scan open loans
+        Index(
+            "ix_issued_books_open_due_date",
+            "due_date",
+            "id",
+            postgresql_where=text("is_returned = false"),
+        ),
+        # Date-range scans for circulation exports
+        Index("ix_issued_books_issue_date", "issue_date"),
+        # Open loans per student and book; issue_book inserts only when none exists
+        Index(
+            "ix_issued_books_open_loan",
+            "book_id",
+            "student_id",
+            postgresql_where=text("is_returned = false"),
+        ),
+        # Covers a student's loan history page (app/utils/loans.py) newest
+        # first, so the issued_books side is an index-only scan
+        Index(
+            "ix_issued_books_student_issue_date",
+            "student_id",
+            text("issue_date DESC"),
+            text("id DESC"),
+            postgresql_include=["book_id", "due_date", "return_date", "is_returned"],
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
+    # Part of the primary key, as in the database, so the ORM's UPDATEs and
+    # DELETEs name the partition key and touch one partition
     issue_date: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, nullable=False
+        DateTime, primary_key=True, default=datetime.utcnow
     )
     due_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     return_date: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     is_returned: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    last_reminder_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
 
     student_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("users.id"), nullable=False
@@ -175,7 +243,9 @@ class IssuedBook(Base):
     book: Mapped["Book"] = relationship(back_populates="issued_books")
 
     fine: Mapped[Optional["Fine"]] = relationship(
-        back_populates="issued_book", uselist=False
+        primaryjoin="IssuedBook.id == foreign(Fine.issued_book_id)",
+        back_populates="issued_book",
+        uselist=False,
     )
 
     def __repr__(self):
@@ -195,10 +265,152 @@ class Fine(Base):
         DateTime, default=datetime.utcnow, nullable=False
     )
 
+    # No foreign key, here or in the database: issued_books is partitioned
+    # and its ids are only unique together with issue_date, so the
+    # relationships name the join themselves
     issued_book_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("issued_books.id"), unique=True, nullable=False
+        UUID(as_uuid=True), unique=True, nullable=False
+    )
+    issued_book: Mapped["IssuedBook"] = relationship(
+        primaryjoin="foreign(Fine.issued_book_id) == IssuedBook.id",
+        back_populates="fine",
     )
-    issued_book: Mapped["IssuedBook"] = relationship(back_populates="fine")
 
     def __repr__(self):
         return f"<Fine(id={self.id}, amount={self.amount}, issued_book_id={self.issued_book_id})>"
+
+
+class HoldStatusEnum(str, enum.Enum):
+    WAITING = "waiting"  # in the queue
+    READY = "ready"  # a returned copy is set aside for the student
+    FULFILLED = "fulfilled"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"  # not collected before expires_at
+
+
+class BookHold(Base):
+    __tablename__ = "book_holds"
+    __table_args__ = (
+        # One active hold per student and book
+        Index(
+            "uq_book_holds_active",
+            "book_id",
+            "student_id",
+            unique=True,
+            postgresql_where=text("status IN ('WAITING', 'READY')"),
+        ),
+        # Head of each book's queue, for allocation on return
+        Index(
+            "ix_book_holds_queue",
+            "book_id",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'WAITING'"),
+        ),
+        # Ready holds past their pickup window, for the expiry job
+        Index(
+            "ix_book_holds_ready_expires_at",
+            "expires_at",
+            postgresql_where=text("status = 'READY'"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    status: Mapped[HoldStatusEnum] = mapped_column(
+        Enum(HoldStatusEnum), default=HoldStatusEnum.WAITING, nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )
+    ready_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    student_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False
+    )
+    book_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("books.id"), nullable=False
+    )
+
+    student: Mapped["User"] = relationship()
+    book: Mapped["Book"] = relationship(back_populates="holds")
+
+    def __repr__(self):
+        return (
+            f"<BookHold(id={self.id}, book_id={self.book_id}, "
+            f"student_id={self.student_id}, status='{self.status.value}')>"
+        )
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # SHA-256 hex digest of the raw JWT, so tokens are never stored in clear
+    token_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    revoked_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False, index=True
+    )
+
+    def __repr__(self):
+        return f"<RevokedToken(token_hash='{self.token_hash[:12]}...', expires_at={self.expires_at})>"
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # SHA-256 of (caller, method, path, Idempotency-Key header)
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # NULL while the first request is still being processed
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    content_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    response_body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )
+    # When the request now processing the key started; a claim with no
+    # response older than the lease belongs to a request that died
+    claimed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(id='{self.id[:12]}...', status_code={self.status_code})>"
+
+
+def propagate_book_name(session, owner, name: str) -> None:
+    """Copy a renamed author's or category's name onto books.author_name / books.category_name."""
+    if isinstance(owner, Author):
+        column, field = Book.author_id, "author_name"
+    else:
+        column, field = Book.category_id, "category_name"
+
+    session.connection().execute(
+        update(Book.__table__)
+        .where(column == owner.id, getattr(Book, field) != name)
+        .values({field: name})
+    )
+    # Books already loaded in this session would otherwise keep the old name
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Book) and obj.__dict__.get(column.key) == owner.id:
+            attributes.set_committed_value(obj, field, name)
+
+
+@event.listens_for(Session, "before_flush")
+def sync_denormalised_book_names(session, flush_context, instances):
+    """Propagate author/category renames made through the ORM to their books."""
+    for obj in list(session.dirty):
+        if isinstance(obj, (Author, Category)) and inspect(obj).attrs.name.history.has_changes():
+            propagate_book_name(session, obj, obj.name)
+
+    # Books whose author/category changed without the name being set
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Book):
+            continue
+        attrs = inspect(obj).attrs
+        if attrs.author_id.history.has_changes() and not attrs.author_name.history.has_changes():
+            obj.author_name = session.get(Author, obj.author_id).name
+        if attrs.category_id.history.has_changes() and not attrs.category_name.history.has_changes():
+            obj.category_name = session.get(Category, obj.category_id).name
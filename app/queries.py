@@ -0,0 +1,62 @@
+"""
+The lookups nearly every request runs, built as ``lambda_stmt``.
+
+SQLAlchemy already caches the compiled SQL of every statement, but a
+``db.query(...)`` chain still rebuilds the statement and its cache key on
+each call. A lambda statement is analysed once per call site; after that a
+call only extracts its bound values (the closure variables) and goes
+straight to the cached compiled form. See benchmarks/hot_queries.py.
+
+psycopg2 has no server-side prepared statements, so this is the per-call
+Python overhead only; PostgreSQL still parses and plans each statement.
+"""
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+def user_by_email(db: Session, email: str) -> Optional[models.User]:
+    stmt = lambda_stmt(
+        lambda: select(models.User).where(models.User.email == email).limit(1)
+    )
+    return db.scalars(stmt).first()
+
+
+def book_by_title(db: Session, title: str) -> Optional[models.Book]:
+    stmt = lambda_stmt(
+        lambda: select(models.Book).where(models.Book.title == title).limit(1)
+    )
+    return db.scalars(stmt).first()
+
+
+def book_matching_title(db: Session, pattern: str) -> Optional[models.Book]:
+    """Case-insensitive ``ILIKE`` match, as typed by a student returning a book."""
+    stmt = lambda_stmt(
+        lambda: select(models.Book).where(models.Book.title.ilike(pattern)).limit(1)
+    )
+    return db.scalars(stmt).first()
+
+
+def author_by_name(db: Session, name: str) -> Optional[models.Author]:
+    stmt = lambda_stmt(
+        lambda: select(models.Author).where(models.Author.name == name).limit(1)
+    )
+    return db.scalars(stmt).first()
+
+
+def latest_loan(db: Session, book_id: UUID, student_id: UUID) -> Optional[models.IssuedBook]:
+    """The student's most recent loan of the book, open or returned."""
+    stmt = lambda_stmt(
+        lambda: select(models.IssuedBook)
+        .where(
+            models.IssuedBook.book_id == book_id,
+            models.IssuedBook.student_id == student_id,
+        )
+        .order_by(models.IssuedBook.issue_date.desc())
+        .limit(1)
+    )
+    return db.scalars(stmt).first()
@@ -1,15 +1,34 @@
-from typing import List
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.utils.concurrency import (
+    if_match_versions,
+    insert_unique,
+    set_etag,
+    update_versioned,
+)
+from app.utils.fields import SparseFields, sparse_response
+from app.utils.negotiation import stream_rows, streaming_media_type
 from app.utils.pagination import Pagination
 
 router = APIRouter(prefix="/authors", tags=["Authors"])
 
+author_fields = SparseFields(
+    {
+        "id": models.Author.id,
+        "name": models.Author.name,
+        "email": models.Author.email,
+        "nationality": models.Author.nationality,
+        "created_at": models.Author.created_at,
+    }
+)
+
 
 # Create Author with duplicate email check - Admin Only
 @router.post(
@@ -23,27 +42,36 @@ def create_author(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can create authors")
 
-    existing = (
-        db.query(models.Author).filter(models.Author.email == author.email).first()
+    db_author = insert_unique(
+        db,
+        models.Author,
+        author.dict(),
+        conflict="Author with this email already exists",
     )
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Author with this email already exists"
-        )
-
-    db_author = models.Author(**author.dict())
-    db.add(db_author)
     db.commit()
-    db.refresh(db_author)
     return db_author
 
 
 # Get All Authors - Student & Admin
 @router.get("/", response_model=List[schemas.AuthorResponse])
 def get_authors(
+    request: Request,
     pagination: Pagination = Depends(),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    fields: Optional[List[str]] = Depends(author_fields),
 ):
+    media_type = streaming_media_type(request)
+    if media_type:
+        stmt = select(*author_fields.columns_for(fields or list(author_fields.columns)))
+        return stream_rows(request, stmt, pagination, media_type)
+
+    if fields:
+        return sparse_response(
+            db,
+            select(*author_fields.columns_for(fields))
+            .offset(pagination.offset)
+            .limit(pagination.limit),
+        )
     return db.query(models.Author).offset(pagination.offset).limit(pagination.limit).all()
 
 
@@ -51,7 +79,8 @@ def get_authors(
 @router.get("/by-email/{email}", response_model=schemas.AuthorResponse)
 def get_author_by_email(
     email: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
@@ -62,29 +91,54 @@ def get_author_by_email(
     author = db.query(models.Author).filter(models.Author.email == email).first()
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
+    set_etag(response, author)
     return author
 
 
-# Update Author by Email - Admin Only
+# Get Many Authors by Email in one query - Admin Only
+@router.post("/batch", response_model=Dict[str, Optional[schemas.AuthorResponse]])
+def get_authors_batch(
+    batch: schemas.AuthorBatchRequest,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403, detail="Only admin can get a specific author"
+        )
+
+    authors = db.scalars(
+        select(models.Author).where(models.Author.email.in_(set(batch.emails)))
+    ).all()
+    found = {author.email: author for author in authors}
+    return {email: found.get(email) for email in batch.emails}
+
+
+# Update Author by Email - Admin Only; If-Match makes it conditional (412 when stale)
 @router.put("/by-email/{email}", response_model=schemas.AuthorResponse)
 def update_author_by_email(
     email: str,
     updated_data: schemas.AuthorCreate,
+    response: Response,
+    versions: Optional[List[int]] = Depends(if_match_versions),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can update authors")
 
-    author = db.query(models.Author).filter(models.Author.email == email).first()
-    if not author:
-        raise HTTPException(status_code=404, detail="Author not found")
-
-    for field, value in updated_data.dict().items():
-        setattr(author, field, value)
-
+    author = update_versioned(
+        db,
+        models.Author,
+        [models.Author.email == email],
+        updated_data.dict(),
+        versions,
+        not_found="Author not found",
+    )
+    models.propagate_book_name(db, author, author.name)
     db.commit()
-    db.refresh(author)
+
+    set_etag(response, author)
     return author
 
 
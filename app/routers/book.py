@@ -1,26 +1,50 @@
-from typing import List
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, exists, select
 from sqlalchemy.orm import Session
 
-from app import models, schemas
+from app import models, queries, schemas
 from app.auth import get_current_user
-from app.database import get_db
+from app.config import get_settings
+from app.database import get_db, get_read_db, read_session
+from app.utils.availability import availability_events, publish_availability
+from app.utils.concurrency import (
+    if_match_versions,
+    insert_unique,
+    set_etag,
+    update_versioned,
+)
+from app.utils.fields import SparseFields, sparse_response
+from app.utils.holds import allocate_copies, lock_book, notify_hold_ready
+from app.utils.negotiation import stream_rows, streaming_media_type
 from app.utils.pagination import Pagination
+from app.utils.reference_data import categories
 
+settings = get_settings()
 
 router = APIRouter(prefix="/books", tags=["Books"])
 
+book_fields = SparseFields(
+    {
+        "id": models.Book.id,
+        "title": models.Book.title,
+        "publication_date": models.Book.publication_date,
+        "quantity": models.Book.quantity,
+        "author_name": models.Book.author_name,
+        "category_name": models.Book.category_name,
+    }
+)
+
 
 # Helper function
 def get_author_and_category_ids(db, author_name: str, category_name: str):
-    author = db.query(models.Author).filter(models.Author.name == author_name).first()
+    author = queries.author_by_name(db, author_name)
     if not author:
         raise HTTPException(status_code=404, detail="Author Not Found")
 
-    category = (
-        db.query(models.Category).filter(models.Category.name == category_name).first()
-    )
+    category = categories.get(category_name)
     if not category:
         raise HTTPException(status_code=404, detail="Category Npot Found")
 
@@ -42,22 +66,21 @@ def create_book(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can create authors")
 
-    existing = db.query(models.Book).filter(models.Book.title == book.title).first()
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Books with this title already exists"
-        )
-
-    new_book = models.Book(
-        title=book.title,
-        publication_date=book.publication_date,
-        quantity=book.quantity,
-        author_id=author_id,
-        category_id=category_id,
+    new_book = insert_unique(
+        db,
+        models.Book,
+        dict(
+            title=book.title,
+            publication_date=book.publication_date,
+            quantity=book.quantity,
+            author_id=author_id,
+            category_id=category_id,
+            author_name=book.author_name,
+            category_name=book.category_name,
+        ),
+        conflict="Books with this title already exists",
     )
-    db.add(new_book)
     db.commit()
-    db.refresh(new_book)
 
     return schemas.BookResponse(
         id=new_book.id,
@@ -71,9 +94,24 @@ def create_book(
 
 @router.get("/", response_model=List[schemas.BookResponse])
 def get_all_books(
-    db: Session = Depends(get_db),
-    pagination: Pagination = Depends()
+    request: Request,
+    db: Session = Depends(get_read_db),
+    pagination: Pagination = Depends(),
+    fields: Optional[List[str]] = Depends(book_fields),
 ):
+    media_type = streaming_media_type(request)
+    if media_type:
+        stmt = select(*book_fields.columns_for(fields or list(book_fields.columns)))
+        return stream_rows(request, stmt, pagination, media_type)
+
+    if fields:
+        return sparse_response(
+            db,
+            select(*book_fields.columns_for(fields))
+            .offset(pagination.offset)
+            .limit(pagination.limit),
+        )
+
     books = (
         db.query(models.Book)
         .offset(pagination.offset)
@@ -87,83 +125,160 @@ def get_all_books(
             title=book.title,
             publication_date=book.publication_date,
             quantity=book.quantity,
-            author_name=book.author.name,
-            category_name=book.category.name,
+            author_name=book.author_name,
+            category_name=book.category_name,
         )
         for book in books
     ]
     return result
 
 
+# Look up many books by title in one query; missing titles map to null
+@router.post("/batch", response_model=Dict[str, Optional[schemas.BookResponse]])
+def get_books_batch(
+    batch: schemas.BookBatchRequest,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    books = db.scalars(
+        select(models.Book).where(models.Book.title.in_(set(batch.titles)))
+    ).all()
+    found = {
+        book.title: schemas.BookResponse(
+            id=book.id,
+            title=book.title,
+            publication_date=book.publication_date,
+            quantity=book.quantity,
+            author_name=book.author_name,
+            category_name=book.category_name,
+        )
+        for book in books
+    }
+    return {title: found.get(title) for title in batch.titles}
+
+
+# Live shelf quantities for a set of titles as server-sent events, replacing
+# repeated GET /books/{book_name} polling
+@router.get("/availability/stream", response_class=StreamingResponse)
+def stream_availability(
+    request: Request,
+    title: List[str] = Query(..., description="Titles to watch; repeat for several"),
+):
+    if len(title) > schemas.MAX_BATCH_KEYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {schemas.MAX_BATCH_KEYS} titles per stream",
+        )
+    return StreamingResponse(
+        availability_events(read_session(request), title),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{book_name}", response_model=schemas.BookResponse)
 def get_book(
     book_name: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    book = db.query(models.Book).filter(models.Book.title == book_name).first()
+    book = queries.book_by_title(db, book_name)
     if not book:
         raise HTTPException(status_code=404, detail="Book Not Found")
 
+    set_etag(response, book)
     return schemas.BookResponse(
         id=book.id,
         title=book.title,
         publication_date=book.publication_date,
         quantity=book.quantity,
-        author_name=book.author.name,
-        category_name=book.category.name,
+        author_name=book.author_name,
+        category_name=book.category_name,
     )
 
 
+# Books most often borrowed by the same students, served from memory
+@router.get("/{book_name}/recommendations", response_model=List[schemas.BookRecommendation])
+def get_recommendations(
+    book_name: str,
+    limit: int = Query(10, ge=1, le=settings.recommendation_top_k),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Imported here so importing the router never loads numpy
+    from app.utils.recommendations import np, recommendation_index
+
+    if np is None or not recommendation_index.ready:
+        raise HTTPException(status_code=503, detail="Recommendations are not available")
+    return [
+        schemas.BookRecommendation(**recommendation._asdict())
+        for recommendation in recommendation_index.similar(book_name, limit)
+    ]
+
+
 @router.put("/{book_name}", response_model=schemas.BookUpdate)
 def update_book(
     book_name: str,
     update_book: schemas.BookUpdate,
+    response: Response,
+    versions: Optional[List[int]] = Depends(if_match_versions),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can update Books")
 
-    book = db.query(models.Book).filter(models.Book.title == book_name).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-
+    values = {}
     if update_book.title:
-        book.title = update_book.title
+        values["title"] = update_book.title
     if update_book.publication_date:
-        book.publication_date = update_book.publication_date
+        values["publication_date"] = update_book.publication_date
     if update_book.quantity:
-        book.quantity = update_book.quantity
+        values["quantity"] = update_book.quantity
     if update_book.author_name:
-        author = (
-            db.query(models.Author)
-            .filter(models.Author.name == update_book.author_name)
-            .first()
-        )
+        author = queries.author_by_name(db, update_book.author_name)
         if not author:
             raise HTTPException(status_code=404, detail="Author Not Found")
-        book.author_id = author.id
+        values["author_id"] = author.id
+        values["author_name"] = author.name
     if update_book.category_name:
-        category = (
-            db.query(models.Category)
-            .filter(models.Category.name == update_book.category_name)
-            .first()
-        )
+        category = categories.get(update_book.category_name)
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
-        book.category_id = category.id
+        values["category_id"] = category.id
+        values["category_name"] = category.name
 
+    allocations = []
+    if "quantity" in values:
+        # Added copies serve the hold queue before any reach the shelf
+        current = lock_book(db, models.Book.title == book_name)
+        added = values["quantity"] - current.quantity if current else 0
+        if added > 0:
+            allocations = allocate_copies(db, current.id, added)
+            values["quantity"] -= len(allocations)
+
+    book = update_versioned(
+        db,
+        models.Book,
+        [models.Book.title == book_name],
+        values,
+        versions,
+        not_found="Book not found",
+    )
+    if "quantity" in values:
+        publish_availability(db, book.title, book.quantity)
     db.commit()
-    db.refresh(book)
+    for allocation in allocations:
+        notify_hold_ready(allocation)
 
+    set_etag(response, book)
     return schemas.BookResponse(
         id=book.id,
         title=book.title,
         publication_date=book.publication_date,
         quantity=book.quantity,
-        author_name=book.author.name,
-        category_name=book.category.name,
+        author_name=book.author_name,
+        category_name=book.category_name,
     )
 
 
@@ -176,10 +291,33 @@ def delete_book(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can Delete Books")
 
-    book = db.query(models.Book).filter(models.Book.title == book_name).first()
+    book = queries.book_by_title(db, book_name)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    db.delete(book)
+    # Loans (and the fines on them) are history and keep their book; a hold
+    # still in a queue belongs to a student. Finished holds go with the book.
+    has_loans, has_active_holds = db.execute(
+        select(
+            exists().where(models.IssuedBook.book_id == book.id),
+            exists().where(
+                models.BookHold.book_id == book.id,
+                models.BookHold.status.in_(
+                    (models.HoldStatusEnum.WAITING, models.HoldStatusEnum.READY)
+                ),
+            ),
+        )
+    ).one()
+    if has_loans:
+        raise HTTPException(
+            status_code=409, detail="Book has loans on record and cannot be deleted"
+        )
+    if has_active_holds:
+        raise HTTPException(
+            status_code=409, detail="Book has active holds; cancel them before deleting it"
+        )
+
+    db.execute(delete(models.BookHold).where(models.BookHold.book_id == book.id))
+    db.execute(delete(models.Book).where(models.Book.id == book.id))
     db.commit()
     return {"message": "Book Deleted Successfully!"}
@@ -1,16 +1,32 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.utils.concurrency import (
+    if_match_versions,
+    insert_unique,
+    set_etag,
+    update_versioned,
+)
+from app.utils.fields import SparseFields, sparse_objects_response
 from app.utils.pagination import Pagination
+from app.utils.reference_data import categories
 
 
 router = APIRouter(prefix="/category", tags=["Categories"])
 
+category_fields = SparseFields(
+    {
+        "id": models.Category.id,
+        "name": models.Category.name,
+        "description": models.Category.description,
+    }
+)
+
 
 # Create Category - Admin Only
 @router.post(
@@ -24,18 +40,14 @@ def create_category(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can create categories")
 
-    existing = (
-        db.query(models.Category).filter(models.Category.name == category.name).first()
+    db_category = insert_unique(
+        db,
+        models.Category,
+        category.dict(),
+        conflict="Category with this name already exists",
     )
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Category with this name already exists"
-        )
-
-    db_category = models.Category(**category.dict())
-    db.add(db_category)
+    categories.changed(db)
     db.commit()
-    db.refresh(db_category)
     return db_category
 
 
@@ -43,16 +55,21 @@ def create_category(
 @router.get("/", response_model=List[schemas.CategoryResponse])
 def get_categories(
     pagination: Pagination = Depends(),
-    db: Session = Depends(get_db),
+    fields: Optional[List[str]] = Depends(category_fields),
 ):
-    return db.query(models.Category).offset(pagination.offset).limit(pagination.limit).all()
+    # Served from memory (app/utils/reference_data.py), ordered by name
+    page = categories.all()[pagination.offset:pagination.offset + pagination.limit]
+    if fields:
+        return sparse_objects_response(page, fields)
+    return page
 
 
 # Get One Category by Name - Admin Only
 @router.get("/by-name/{name}", response_model=schemas.CategoryResponse)
 def get_category_by_name(
     name: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
@@ -65,6 +82,7 @@ def get_category_by_name(
     )
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
+    set_etag(response, category)
     return category
 
 
@@ -73,21 +91,27 @@ def get_category_by_name(
 def update_category_by_name(
     name: str,
     updated_data: schemas.CategoryCreate,
+    response: Response,
+    versions: Optional[List[int]] = Depends(if_match_versions),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can update categories")
 
-    category = db.query(models.Category).filter(models.Category.name == name).first()
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-
-    for field, value in updated_data.dict().items():
-        setattr(category, field, value)
-
+    category = update_versioned(
+        db,
+        models.Category,
+        [models.Category.name == name],
+        updated_data.dict(),
+        versions,
+        not_found="Category not found",
+    )
+    models.propagate_book_name(db, category, category.name)
+    categories.changed(db)
     db.commit()
-    db.refresh(category)
+
+    set_etag(response, category)
     return category
 
 
@@ -106,5 +130,6 @@ def delete_category_by_name(
         raise HTTPException(status_code=404, detail="Category not found")
 
     db.delete(category)
+    categories.changed(db)
     db.commit()
     return {"message": "Category Deleted Successfully!"}
@@ -1,16 +1,33 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from app import models, schemas
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.utils.concurrency import (
+    if_match_versions,
+    insert_unique,
+    set_etag,
+    update_versioned,
+)
+from app.utils.fields import SparseFields, sparse_objects_response
 from app.utils.pagination import Pagination
+from app.utils.reference_data import courses
 
 
 router = APIRouter(prefix="/course", tags=["Courses"])
 
+course_fields = SparseFields(
+    {
+        "id": models.Course.id,
+        "name": models.Course.name,
+        "description": models.Course.description,
+        "year": models.Course.year,
+    }
+)
+
 
 @router.post(
     "/", response_model=schemas.CourseResponse, status_code=status.HTTP_201_CREATED
@@ -23,18 +40,14 @@ def create_course(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can create Courses.")
 
-    existing = db.query(models.Course).filter(models.Course.name == course.name).first()
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Course with this name already exists"
-        )
-
-    new_course = models.Course(
-        name=course.name, description=course.description, year=course.year
+    new_course = insert_unique(
+        db,
+        models.Course,
+        dict(name=course.name, description=course.description, year=course.year),
+        conflict="Course with this name already exists",
     )
-    db.add(new_course)
+    courses.changed(db)
     db.commit()
-    db.refresh(new_course)
 
     return schemas.CourseResponse(
         id=new_course.id,
@@ -45,24 +58,22 @@ def create_course(
 
 
 @router.get("/", response_model=List[schemas.CourseResponse])
-def get_all_course(db: Session = Depends(get_db), pagination: Pagination = Depends()):
-    courses = db.query(models.Course).offset(pagination.offset).limit(pagination.limit).all()
-    result = [
-        schemas.CourseResponse(
-            id=course.id,
-            name=course.name,
-            description=course.description,
-            year=course.year,
-        )
-        for course in courses
-    ]
-    return result
+def get_all_course(
+    pagination: Pagination = Depends(),
+    fields: Optional[List[str]] = Depends(course_fields),
+):
+    # Served from memory (app/utils/reference_data.py), ordered by name
+    page = courses.all()[pagination.offset:pagination.offset + pagination.limit]
+    if fields:
+        return sparse_objects_response(page, fields)
+    return page
 
 
 @router.get("/{course_name}", response_model=schemas.CourseResponse)
 def get_course(
     course_name: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
 
@@ -70,6 +81,7 @@ def get_course(
     if not course:
         raise HTTPException(status_code=404, detail="Course Not Found")
 
+    set_etag(response, course)
     return schemas.CourseResponse(
         id=course.id, name=course.name, description=course.description, year=course.year
     )
@@ -79,23 +91,26 @@ def get_course(
 def update_course(
     course_name: str,
     update_course: schemas.CourseUpdate,
+    response: Response,
+    versions: Optional[List[int]] = Depends(if_match_versions),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can update Courses")
 
-    course = db.query(models.Course).filter(models.Course.name == course_name).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    course.name = update_course.name
-    course.description = update_course.description
-    course.year = update_course.year
-
+    course = update_versioned(
+        db,
+        models.Course,
+        [models.Course.name == course_name],
+        update_course.dict(),
+        versions,
+        not_found="Course not found",
+    )
+    courses.changed(db)
     db.commit()
-    db.refresh(course)
 
+    set_etag(response, course)
     return schemas.CourseResponse(
         id=course.id, name=course.name, description=course.description, year=course.year
     )
@@ -115,5 +130,6 @@ def delete_course(
         raise HTTPException(status_code=404, detail="Book not found")
 
     db.delete(course)
+    courses.changed(db)
     db.commit()
     return {"message": "Course Deleted Successfully!"}
@@ -0,0 +1,56 @@
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app import models
+from app.auth import get_current_user
+from app.database import read_session
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+# Stream loan and fine history for reporting - Admin Only
+@router.get("/circulation")
+def export_circulation(
+    request: Request,
+    format: ExportFormat = ExportFormat.CSV,
+    start: date = Query(description="First issue date included"),
+    end: Optional[date] = Query(default=None, description="Last issue date included (default: today)"),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Imported here so importing the router never loads pyarrow
+    from app.utils import export
+
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can export circulation history")
+
+    end = end or date.today()
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    lower = datetime.combine(start, time.min)
+    upper = datetime.combine(end + timedelta(days=1), time.min)
+    filename = f"circulation_{start.isoformat()}_{end.isoformat()}.{format.value}"
+
+    if format == ExportFormat.PARQUET:
+        if export.pq is None:
+            raise HTTPException(status_code=406, detail="Parquet export is not available")
+        body = export.circulation_parquet(read_session(request), lower, upper)
+        media_type = "application/vnd.apache.parquet"
+    else:
+        body = export.circulation_csv(read_session(request), lower, upper)
+        media_type = "text/csv"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,143 @@
+from datetime import datetime
+from typing import List
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.auth import get_current_user
+from app.database import get_db, get_read_db
+from app.models import HoldStatusEnum
+from app.utils.concurrency import insert_unique
+from app.utils.holds import allocate_copy, lock_book, notify_hold_ready
+
+router = APIRouter(prefix="/holds", tags=["Holds"])
+
+ACTIVE_STATUSES = (HoldStatusEnum.WAITING, HoldStatusEnum.READY)
+
+
+# Join the queue for a title with no copies on the shelf - Student Only
+@router.post("/", response_model=schemas.HoldResponse, status_code=status.HTTP_201_CREATED)
+def place_hold(
+    hold_data: schemas.HoldCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Only students can place holds.")
+
+    # Locked until commit, so a copy returned meanwhile either is still on the
+    # shelf (and this hold is refused) or waits and then finds this hold
+    book = lock_book(db, models.Book.title == hold_data.book_title)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if book.quantity > 0:
+        raise HTTPException(
+            status_code=400, detail="Copies are available; issue the book instead"
+        )
+
+    hold = insert_unique(
+        db,
+        models.BookHold,
+        dict(
+            book_id=book.id,
+            student_id=current_user.id,
+            status=HoldStatusEnum.WAITING,
+            created_at=datetime.utcnow(),
+        ),
+        conflict="You already have an active hold on this book",
+        index_elements=[models.BookHold.book_id, models.BookHold.student_id],
+        index_where=models.BookHold.status.in_(ACTIVE_STATUSES),
+    )
+    position = db.scalar(
+        select(func.count()).where(
+            models.BookHold.book_id == book.id,
+            models.BookHold.status == HoldStatusEnum.WAITING,
+            models.BookHold.created_at <= hold.created_at,
+        )
+    )
+    db.commit()
+
+    return schemas.HoldResponse(
+        id=hold.id,
+        book_title=hold_data.book_title,
+        status=hold.status,
+        created_at=hold.created_at,
+        position=position,
+    )
+
+
+# Active holds of the current student with their place in each queue
+@router.get("/me", response_model=List[schemas.HoldResponse])
+def get_my_holds(
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    queue = (
+        select(
+            models.BookHold.id,
+            func.row_number()
+            .over(
+                partition_by=models.BookHold.book_id,
+                order_by=(models.BookHold.created_at, models.BookHold.id),
+            )
+            .label("position"),
+        )
+        .where(
+            models.BookHold.status == HoldStatusEnum.WAITING,
+            models.BookHold.book_id.in_(
+                select(models.BookHold.book_id).where(
+                    models.BookHold.student_id == current_user.id
+                )
+            ),
+        )
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            models.BookHold.id,
+            models.Book.title.label("book_title"),
+            models.BookHold.status,
+            models.BookHold.created_at,
+            queue.c.position,
+            models.BookHold.expires_at,
+        )
+        .join(models.Book, models.BookHold.book_id == models.Book.id)
+        .outerjoin(queue, queue.c.id == models.BookHold.id)
+        .where(
+            models.BookHold.student_id == current_user.id,
+            models.BookHold.status.in_(ACTIVE_STATUSES),
+        )
+        .order_by(models.BookHold.created_at)
+    ).mappings()
+    return [schemas.HoldResponse(**row) for row in rows]
+
+
+# Cancel own hold; a copy already set aside passes to the next in the queue
+@router.delete("/{hold_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_hold(
+    hold_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    hold = db.scalars(
+        select(models.BookHold)
+        .where(
+            models.BookHold.id == hold_id,
+            models.BookHold.student_id == current_user.id,
+            models.BookHold.status.in_(ACTIVE_STATUSES),
+        )
+        .with_for_update()
+    ).first()
+    if not hold:
+        raise HTTPException(status_code=404, detail="Active hold not found")
+
+    allocation = None
+    if hold.status == HoldStatusEnum.READY:
+        allocation = allocate_copy(db, hold.book_id)
+    hold.status = HoldStatusEnum.CANCELLED
+    db.commit()
+
+    notify_hold_ready(allocation)
@@ -1,40 +1,75 @@
+import uuid
 from datetime import datetime, timedelta
-from decimal import Decimal
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
-from app import models, schemas
+from app import models, queries, schemas
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.models import HoldStatusEnum
+from app.utils.availability import publish_availability
+from app.utils.concurrency import insert_absent
+from app.utils.holds import allocate_copy, lock_book, notify_hold_ready
+from app.utils.loans import loan_history
+from app.utils.negotiation import stream_rows, streaming_media_type
+from app.utils.overdue import calculate_fine
+from app.utils.pagination import KeysetPagination, Pagination
 
 router = APIRouter(prefix="/issued-books", tags=["Issued Books"])
 
 
 @router.get("/", response_model=List[schemas.IssuedBookResponse])
 def get_all_issued_books(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
+    pagination: Pagination = Depends(),
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can view issued books")
 
-    issued_books = db.query(models.IssuedBook).all()
-    result = []
-    for issued in issued_books:
-        result.append(
-            schemas.IssuedBookResponse(
-                id=issued.id,
-                student_name=issued.student.name,
-                book_title=issued.book.title,
-                issue_date=issued.issue_date,
-                due_date=issued.due_date,
-                return_date=issued.return_date,
-                is_returned=issued.is_returned,
-            )
+    stmt = (
+        select(
+            models.IssuedBook.id,
+            models.User.name.label("student_name"),
+            models.Book.title.label("book_title"),
+            models.IssuedBook.issue_date,
+            models.IssuedBook.due_date,
+            models.IssuedBook.return_date,
+            models.IssuedBook.is_returned,
         )
-    return result
+        .join(models.User, models.IssuedBook.student_id == models.User.id)
+        .join(models.Book, models.IssuedBook.book_id == models.Book.id)
+        # id breaks ties, so offset pages neither repeat nor skip loans
+        .order_by(models.IssuedBook.issue_date, models.IssuedBook.id)
+    )
+    media_type = streaming_media_type(request)
+    if media_type:
+        return stream_rows(request, stmt, pagination, media_type)
+
+    # Names come from the join; loading issued.student / issued.book per row
+    # would cost two queries per loan. As when streamed, the full list is
+    # returned unless the client asks for a page with limit
+    stmt = stmt.offset(pagination.offset)
+    if "limit" in request.query_params:
+        stmt = stmt.limit(pagination.limit)
+    return [
+        schemas.IssuedBookResponse(**row)
+        for row in db.execute(stmt).mappings()
+    ]
+
+
+# The current student's loans, newest first, with fines
+@router.get("/me", response_model=schemas.LoanPage)
+def get_my_loans(
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    page: KeysetPagination = Depends(),
+):
+    return loan_history(db, current_user.id, page)
 
 
 @router.post(
@@ -53,60 +88,74 @@ def issue_book(
             status_code=403, detail="Students can only issue books for themselves."
         )
 
-    student = (
-        db.query(models.User)
-        .filter(models.User.name == issue_book.student_name)
-        .first()
-    )
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-
-    book = (
-        db.query(models.Book).filter(models.Book.title == issue_book.book_title).first()
-    )
+    # Both ways of getting a copy below run under the book's row lock, so
+    # concurrent issues of one book by the same student are serialised and
+    # the insert's check for an open loan sees any that committed first
+    book = lock_book(db, models.Book.title == issue_book.book_title)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    already_issued = (
-        db.query(models.IssuedBook)
-        .filter(
-            models.IssuedBook.book_id == book.id,
-            models.IssuedBook.student_id == student.id,
-            models.IssuedBook.is_returned == False,
-        )
-        .first()
-    )
-
-    if already_issued:
-        raise HTTPException(
-            status_code=400, detail="Book is already issued and not returned"
-        )
-
-    if book.quantity <= 0:
-        raise HTTPException(
-            status_code=400, detail="No copies of the book are available to issue"
+    # A copy set aside for this student's hold is theirs; it never went back
+    # on the shelf, so quantity is left alone
+    from_hold = db.execute(
+        update(models.BookHold)
+        .where(
+            models.BookHold.student_id == current_user.id,
+            models.BookHold.status == HoldStatusEnum.READY,
+            models.BookHold.book_id == book.id,
         )
-
-    # Decrease available quantity
-    book.quantity -= 1
-
-    # Create new issued book
-    issued_book = models.IssuedBook(
-        student_id=student.id,
-        book_id=book.id,
-        issue_date=datetime.utcnow(),
-        due_date=datetime.utcnow() + timedelta(days=10),
-        is_returned=False,
+        .values(status=HoldStatusEnum.FULFILLED)
+        .returning(models.BookHold.id)
+    ).first()
+
+    # Otherwise take a copy off the shelf; bump the version so stale
+    # If-Match updates are rejected
+    if not from_hold:
+        if book.quantity < 1:
+            raise HTTPException(
+                status_code=400,
+                detail="No copies of the book are available to issue; place a hold at POST /holds/ to be notified",
+            )
+        quantity = db.execute(
+            update(models.Book)
+            .where(models.Book.id == book.id)
+            .values(
+                quantity=models.Book.quantity - 1,
+                version=models.Book.version + 1,
+            )
+            .returning(models.Book.quantity)
+        ).scalar_one()
+        publish_availability(db, issue_book.book_title, quantity)
+
+    # One open loan per student and book. issued_books is partitioned, so no
+    # unique index can say so; the book lock above serialises concurrent
+    # requests and the insert re-checks under it. On conflict the request
+    # fails and the changes above are rolled back.
+    now = datetime.utcnow()
+    issued_book = insert_absent(
+        db,
+        models.IssuedBook,
+        dict(
+            id=uuid.uuid4(),
+            student_id=current_user.id,
+            book_id=book.id,
+            issue_date=now,
+            due_date=now + timedelta(days=10),
+            is_returned=False,
+        ),
+        criteria=(
+            models.IssuedBook.book_id == book.id,
+            models.IssuedBook.student_id == current_user.id,
+            models.IssuedBook.is_returned.is_(False),
+        ),
+        conflict="Book is already issued and not returned",
     )
-
-    db.add_all([book, issued_book])
     db.commit()
-    db.refresh(issued_book)
 
     return schemas.IssuedBookResponse(
         id=issued_book.id,
-        student_name=student.name,
-        book_title=book.title,
+        student_name=issue_book.student_name,
+        book_title=issue_book.book_title,
         issue_date=issued_book.issue_date,
         due_date=issued_book.due_date,
         return_date=issued_book.return_date,
@@ -114,6 +163,18 @@ def issue_book(
     )
 
 
+def _already_returned(issued_book: models.IssuedBook, book: models.Book, student: models.User):
+    return schemas.ReturnIssuedBookResponse(
+        issued_book_id=issued_book.id,
+        student_name=student.name,
+        book_title=book.title,
+        return_date=issued_book.return_date,
+        is_returned=issued_book.is_returned,
+        message=f"'{book.title}' was already returned on {issued_book.return_date.strftime('%Y-%m-%d %H:%M:%S')}.",
+        fine_amount=None,
+    )
+
+
 @router.post("/return", response_model=schemas.ReturnIssuedBookResponse)
 def return_book(
     return_data: schemas.ReturnBookRequest,
@@ -123,23 +184,11 @@ def return_book(
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students can return books.")
 
-    book = (
-        db.query(models.Book)
-        .filter(models.Book.title.ilike(return_data.book_title))
-        .first()
-    )
+    book = queries.book_matching_title(db, return_data.book_title)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found.")
 
-    issued_book = (
-        db.query(models.IssuedBook)
-        .filter(
-            models.IssuedBook.book_id == book.id,
-            models.IssuedBook.student_id == current_user.id,
-        )
-        .order_by(models.IssuedBook.issue_date.desc())
-        .first()
-    )
+    issued_book = queries.latest_loan(db, book.id, current_user.id)
 
     if not issued_book:
         raise HTTPException(
@@ -148,33 +197,38 @@ def return_book(
         )
 
     if issued_book.is_returned:
-        return schemas.ReturnIssuedBookResponse(
-            issued_book_id=issued_book.id,
-            student_name=current_user.name,
-            book_title=book.title,
-            return_date=issued_book.return_date,
-            is_returned=issued_book.is_returned,
-            message=f"'{book.title}' was already returned on {issued_book.return_date.strftime('%Y-%m-%d %H:%M:%S')}.",
-            fine_amount=None,
+        return _already_returned(issued_book, book, current_user)
+
+    # Close the loan only if it is still open, so of two concurrent returns
+    # of it only one gets a row back and hands on the copy
+    closed = db.execute(
+        update(models.IssuedBook)
+        .where(
+            models.IssuedBook.id == issued_book.id,
+            models.IssuedBook.issue_date == issued_book.issue_date,
+            models.IssuedBook.is_returned.is_(False),
         )
-
-    issued_book.is_returned = True
-    issued_book.return_date = datetime.utcnow()
-
-    book.quantity += 1
-
-    fine_amount = None
-    if issued_book.return_date.date() > issued_book.due_date.date():
-        late_days = (issued_book.return_date.date() - issued_book.due_date.date()).days
-        fine_amount = Decimal(late_days * 10)
-
-        fine = models.Fine(amount=fine_amount, issued_book_id=issued_book.id)
-        db.add(fine)
-
-    db.commit()
-    db.refresh(issued_book)
-    
-    return schemas.ReturnIssuedBookResponse(
+        .values(is_returned=True, return_date=datetime.utcnow())
+        .returning(models.IssuedBook.id)
+    ).first()
+    if not closed:
+        db.refresh(issued_book)
+        return _already_returned(issued_book, book, current_user)
+
+    # The copy goes to the head of the hold queue, or back on the shelf
+    allocation = allocate_copy(db, book.id, issued_book.return_date)
+
+    fine_amount = calculate_fine(issued_book.due_date, issued_book.return_date)
+    if fine_amount:
+        # The overdue scanner may already have accrued a fine for this loan
+        if issued_book.fine:
+            issued_book.fine.amount = fine_amount
+            issued_book.fine.date = issued_book.return_date
+        else:
+            fine = models.Fine(amount=fine_amount, issued_book_id=issued_book.id)
+            db.add(fine)
+
+    response = schemas.ReturnIssuedBookResponse(
         issued_book_id=issued_book.id,
         student_name=current_user.name,
         book_title=book.title,
@@ -183,3 +237,7 @@ def return_book(
         message="Book returned successfully",
         fine_amount=fine_amount,
     )
+    db.commit()
+    notify_hold_ready(allocation)
+
+    return response
@@ -1,37 +1,71 @@
-from typing import List
+from typing import Dict, List, Optional
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app import database, models, schemas
-from app.auth import Hash, create_access_token, get_current_user
-from app.utils.email_service import send_email
-from app.utils.pagination import Pagination
+from app import database, models, queries, schemas
+from app.auth import (
+    Hash,
+    create_access_token,
+    get_current_user,
+    oauth2_scheme,
+    revoke_token,
+)
+from app.utils.concurrency import (
+    if_match_versions,
+    insert_unique,
+    set_etag,
+    update_versioned,
+)
+from app.utils.email_service import enqueue_email
+from app.utils.fields import SparseFields, sparse_response
+from app.utils.loans import loan_history
+from app.utils.pagination import KeysetPagination, Pagination
 
 
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Never expose the password hash
+user_fields = SparseFields(
+    {
+        "id": models.User.id,
+        "name": models.User.name,
+        "email": models.User.email,
+        "role": models.User.role,
+        "enroll_number": models.User.enroll_number,
+        "mobile_number": models.User.mobile_number,
+        "gender": models.User.gender,
+        "course_id": models.User.course_id,
+        "created_at": models.User.created_at,
+    }
+)
+
 
 @router.post("/register", response_model=schemas.UserResponse)
 def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     hashed_pw = Hash.hash_password(user.password)
-    # Create new user
-    new_user = models.User(
-        name=user.name,
-        email=user.email,
-        password=hashed_pw,
-        role=user.role,
-        enroll_number=user.enroll_number,
-        mobile_number=user.mobile_number,
-        gender=user.gender,
-        course_id=user.course_id,
+    # Create new user; email and enroll_number are unique
+    new_user = insert_unique(
+        db,
+        models.User,
+        dict(
+            name=user.name,
+            email=user.email,
+            password=hashed_pw,
+            role=user.role,
+            enroll_number=user.enroll_number,
+            mobile_number=user.mobile_number,
+            gender=user.gender,
+            course_id=user.course_id,
+        ),
+        conflict="User with this email or enroll number already exists",
     )
-    db.add(new_user)
     db.commit()
-    db.refresh(new_user)
     # Send email after registration
-    send_email(
+    enqueue_email(
         to_email=user.email,
         subject="Library Registration Successful",
         body=f"Hello {user.name},\n\nWelcome to the Library System! Your registration was successful."
@@ -40,18 +74,62 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_d
 
 
 @router.get("/all", response_model=List[schemas.UserResponse])
-def get_all_users(pagination: Pagination = Depends(), db: Session = Depends(database.get_db)):
+def get_all_users(
+    pagination: Pagination = Depends(),
+    db: Session = Depends(database.get_read_db),
+    fields: Optional[List[str]] = Depends(user_fields),
+):
+    if fields:
+        return sparse_response(
+            db,
+            select(*user_fields.columns_for(fields))
+            .offset(pagination.offset)
+            .limit(pagination.limit),
+        )
     return db.query(models.User).offset(pagination.offset).limit(pagination.limit).all()
 
 
+# Look up many users by id in one query - Admin Only
+@router.post("/batch", response_model=Dict[UUID, Optional[schemas.UserResponse]])
+def get_users_batch(
+    batch: schemas.UserBatchRequest,
+    db: Session = Depends(database.get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can look up users")
+
+    users = db.scalars(
+        select(models.User).where(models.User.id.in_(set(batch.ids)))
+    ).all()
+    found = {user.id: user for user in users}
+    return {user_id: found.get(user_id) for user_id in batch.ids}
+
+
+# A student's loans, newest first, with fines - Admin Only
+@router.get("/{user_id}/loans", response_model=schemas.LoanPage)
+def get_user_loans(
+    user_id: UUID,
+    db: Session = Depends(database.get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    page: KeysetPagination = Depends(),
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view a user's loans")
+
+    if not db.scalar(select(models.User.id).where(models.User.id == user_id)):
+        raise HTTPException(status_code=404, detail="User not found")
+    return loan_history(db, user_id, page)
+
+
 @router.post("/login")
 def login(request: schemas.UserLogin, db: Session = Depends(database.get_db)):
-    db_user = db.query(models.User).filter(models.User.email == request.email).first()
+    db_user = queries.user_by_email(db, request.email)
     if not db_user or not Hash.verify_password(db_user.password, request.password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     token = create_access_token({"sub": db_user.email})
-    send_email(
+    enqueue_email(
         to_email=db_user.email,
         subject="Library Login Notification",
         body=f"Hello {db_user.name},\n\nYou have successfully logged in to the Library System."
@@ -62,25 +140,28 @@ def login(request: schemas.UserLogin, db: Session = Depends(database.get_db)):
 @router.put("/update-profile", response_model=schemas.UserResponse)
 def update_own_profile(
     updated_data: schemas.UserUpdate,
+    response: Response,
+    versions: Optional[List[int]] = Depends(if_match_versions),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    user_query = db.query(models.User).filter(models.User.email == current_user.email)
-    user = user_query.first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     update_dict = updated_data.dict(exclude_unset=True)
 
     # Hash password if being updated
     if "password" in update_dict:
         update_dict["password"] = Hash.hash_password(update_dict["password"])
 
-    user_query.update(update_dict)
+    user = update_versioned(
+        db,
+        models.User,
+        [models.User.id == current_user.id],
+        update_dict,
+        versions,
+        not_found="User not found",
+    )
     db.commit()
-    db.refresh(user)
 
+    set_etag(response, user)
     return user
 
 
@@ -109,6 +190,12 @@ def delete_own_profile(
 
 
 @router.post("/logout")
-def logout(current_user: models.User = Depends(get_current_user)):
-    # No action needed for JWT logout on server unless using token blacklist
-    return {"message": f"User {current_user.email} logged out successfully"}
+def logout(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Read before revoke_token commits and expires current_user
+    email = current_user.email
+    revoke_token(token, db)
+    return {"message": f"User {email} logged out successfully"}
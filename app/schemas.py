@@ -1,11 +1,14 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, EmailStr, Field, validator
 
-from app.models import GenderEnum, UserRoleEnum, YearEnum
+from app.models import GenderEnum, HoldStatusEnum, UserRoleEnum, YearEnum
+
+# Upper bound on keys accepted by the batch lookup endpoints
+MAX_BATCH_KEYS = 100
 
 
 # Base schema (shared fields)
@@ -29,6 +32,10 @@ class AuthorResponse(AuthorBase):
         orm_mode = True  # Important to work with SQLAlchemy models
 
 
+class AuthorBatchRequest(BaseModel):
+    emails: List[EmailStr] = Field(min_length=1, max_length=MAX_BATCH_KEYS)
+
+
 class CategoryBase(BaseModel):
     name: str
     description: str
@@ -75,6 +82,10 @@ class UserResponse(UserBase):
         orm_mode = True
 
 
+class UserBatchRequest(BaseModel):
+    ids: List[UUID] = Field(min_length=1, max_length=MAX_BATCH_KEYS)
+
+
 class UserUpdate(BaseModel):
     name: Optional[str]
     password: Optional[str]
@@ -112,6 +123,10 @@ class BookResponse(BookBase):
     model_config = {"from_attributes": True}
 
 
+class BookBatchRequest(BaseModel):
+    titles: List[str] = Field(min_length=1, max_length=MAX_BATCH_KEYS)
+
+
 class CourseBase(BaseModel):
     name: str
     description: str
@@ -188,3 +203,47 @@ class ReturnIssuedBookResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class LoanResponse(BaseModel):
+    id: UUID
+    book_title: str
+    issue_date: datetime
+    due_date: datetime
+    return_date: Optional[datetime]
+    is_returned: bool
+    fine_amount: Optional[Decimal] = None
+
+
+class LoanPage(BaseModel):
+    items: List[LoanResponse]
+    # Pass as ?cursor= for the next page; null on the last page
+    next_cursor: Optional[str] = None
+
+
+class BookRecommendation(BaseModel):
+    title: str
+    author_name: str
+    # Cosine similarity of the two books' borrower sets, from 0 to 1
+    score: float
+
+
+class HoldCreate(BaseModel):
+    book_title: str
+
+    @validator("book_title")
+    def not_empty(cls, v):
+        if not v.strip():
+            raise ValueError("Book title cannot be empty")
+        return v.strip()
+
+
+class HoldResponse(BaseModel):
+    id: UUID
+    book_title: str
+    status: HoldStatusEnum
+    created_at: datetime
+    # Place in the book's queue while waiting
+    position: Optional[int] = None
+    # Set once a copy is allocated; the hold expires if not collected by then
+    expires_at: Optional[datetime] = None
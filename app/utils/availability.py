@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.config import get_settings
+from app.utils.notify import notify, pg_listener
+
+settings = get_settings()
+
+AVAILABILITY_CHANNEL = "book_availability"
+
+
+def publish_availability(db: Session, title: str, quantity: int):
+    """Announce a title's new shelf quantity to every worker once ``db`` commits."""
+    notify(
+        db,
+        AVAILABILITY_CHANNEL,
+        orjson.dumps({"title": title, "quantity": quantity}).decode(),
+    )
+
+
+class Subscription:
+    """
+    One SSE connection's titles and the latest quantity per title not yet
+    sent. A burst of changes to one title collapses into a single event.
+    """
+
+    def __init__(self, titles: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.titles = frozenset(titles)
+        self.loop = loop
+        self.pending: Dict[str, int] = {}
+        self.changed = asyncio.Event()
+        self.closed = False
+
+    # Called on the event loop only
+    def offer(self, title: str, quantity: int):
+        self.pending[title] = quantity
+        self.changed.set()
+
+    def close(self):
+        self.closed = True
+        self.changed.set()
+
+    def take(self) -> Dict[str, int]:
+        self.changed.clear()
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+class AvailabilityHub:
+    """Fans notifications from the listener thread out to this worker's subscriptions."""
+
+    def __init__(self):
+        self._by_title = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, titles: Iterable[str]) -> Subscription:
+        subscription = Subscription(titles, asyncio.get_running_loop())
+        with self._lock:
+            for title in subscription.titles:
+                self._by_title[title].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for title in subscription.titles:
+                subscribers = self._by_title.get(title)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_title[title]
+
+    # pg_listener callback, runs on the listener thread
+    def dispatch(self, payload: str):
+        change = orjson.loads(payload)
+        with self._lock:
+            subscribers = list(self._by_title.get(change["title"], ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(
+                subscription.offer, change["title"], change["quantity"]
+            )
+
+    def close_all(self):
+        with self._lock:
+            subscriptions = {sub for subs in self._by_title.values() for sub in subs}
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.close)
+
+
+availability_hub = AvailabilityHub()
+pg_listener.subscribe(AVAILABILITY_CHANNEL, availability_hub.dispatch)
+
+
+def _event(title: str, quantity: int) -> bytes:
+    data = orjson.dumps({"title": title, "quantity": quantity})
+    return b"event: availability\ndata: " + data + b"\n\n"
+
+
+def _snapshot(db: Session, titles) -> Dict[str, int]:
+    try:
+        rows = db.execute(
+            select(models.Book.title, models.Book.quantity).where(
+                models.Book.title.in_(titles)
+            )
+        )
+        return dict(rows.all())
+    finally:
+        db.close()
+
+
+async def availability_events(db: Session, titles):
+    """
+    Server-sent events for ``titles``: current quantities first, then one
+    event per changed title at most every ``availability_coalesce_seconds``.
+    The stream ends after ``sse_max_connection_seconds`` and the client
+    reconnects, so no connection outlives a graceful shutdown for long.
+    """
+    subscription = availability_hub.subscribe(titles)
+    try:
+        # Subscribed before reading, so no change between the two is missed
+        snapshot = await run_in_threadpool(_snapshot, db, subscription.titles)
+        yield b"retry: 1000\n\n" + b"".join(
+            _event(title, quantity) for title, quantity in snapshot.items()
+        )
+
+        deadline = time.monotonic() + settings.sse_max_connection_seconds
+        while not subscription.closed and time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(
+                    subscription.changed.wait(), settings.sse_keepalive_seconds
+                )
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            # Let the rest of a burst arrive before sending
+            await asyncio.sleep(settings.availability_coalesce_seconds)
+            changes = subscription.take()
+            if changes:
+                yield b"".join(_event(title, quantity) for title, quantity in changes.items())
+    finally:
+        availability_hub.unsubscribe(subscription)
@@ -0,0 +1,61 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+from sqlalchemy import func, select
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Run ``func`` every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, name: str, func: Callable[[], None], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Background job %s failed", self.name)
+            self._stop.wait(self.interval)
+
+
+@contextmanager
+def advisory_lock(engine, key: int):
+    """
+    Leader election across replicas: yields a connection holding the
+    PostgreSQL session-level advisory lock ``key``, or ``None`` when another
+    worker already holds it.
+    """
+    with engine.connect() as conn:
+        acquired = conn.execute(select(func.pg_try_advisory_lock(key))).scalar()
+        # The lock survives the commit; end the implicit transaction so the
+        # caller can run its own transactions on this connection.
+        conn.commit()
+        if not acquired:
+            yield None
+            return
+        try:
+            yield conn
+        finally:
+            conn.execute(select(func.pg_advisory_unlock(key)))
+            conn.commit()
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is down instead of letting every caller
+    wait for its timeout.
+
+    Closed: calls go through; consecutive failures are counted. After
+    ``failure_threshold`` of them the breaker opens and ``before_call``
+    raises ``CircuitOpenError`` for ``reset_seconds``. Then it is half-open:
+    one probe is let through, and the next success closes the breaker while
+    a failure opens it again. A probe that never reports back is followed by
+    another after ``reset_seconds``.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are failing fast (open, or half-open awaiting its probe)."""
+        return self.state != self.CLOSED
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is let through."""
+        return max(self.reset_seconds - (time.monotonic() - self._opened_at), 0.0)
+
+    def before_call(self):
+        if self.state == self.CLOSED:
+            return
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._opened_at = now
+                return
+        raise CircuitOpenError(self.name, self.retry_after)
+
+    def record_success(self):
+        # Called on every successful call; skip the lock when there is nothing to reset
+        if self.state == self.CLOSED and not self._failures:
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("%s circuit closed", self.name)
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    logger.warning(
+                        "%s circuit opened after %s failures", self.name, self._failures
+                    )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+# Primary database; fed by engine events in app/database.py
+db_breaker = CircuitBreaker(
+    "database", settings.breaker_failure_threshold, settings.breaker_reset_seconds
+)
+smtp_breaker = CircuitBreaker(
+    "smtp", settings.breaker_failure_threshold, settings.breaker_reset_seconds
+)
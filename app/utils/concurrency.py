@@ -0,0 +1,124 @@
+from typing import List, Optional
+
+from fastapi import Header, HTTPException, Response
+from sqlalchemy import insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_etag(response: Response, obj) -> None:
+    response.headers["ETag"] = etag(obj.version)
+
+
+def if_match_versions(
+    if_match: Optional[str] = Header(
+        default=None,
+        description='ETag from a previous response, e.g. "3"; the update fails with 412 if it is stale',
+    ),
+) -> Optional[List[int]]:
+    """
+    Versions accepted by an ``If-Match`` header, or ``None`` when the header
+    is absent or ``*`` (unconditional update).
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        # Proxies that compress responses may weaken the ETag; the version is the same
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        try:
+            versions.append(int(tag.strip('"')))
+        except ValueError:
+            continue
+    if not versions:
+        raise HTTPException(status_code=412, detail="Precondition failed")
+    return versions
+
+
+def update_versioned(
+    db: Session,
+    model,
+    criteria: list,
+    values: dict,
+    versions: Optional[List[int]],
+    not_found: str,
+):
+    """
+    Apply ``values`` and bump the version in a single
+    ``UPDATE ... WHERE ... AND version IN (...) RETURNING`` statement.
+
+    Raises 404 if no row matches ``criteria`` and 412 if the row exists at a
+    different version. The returned object is detached so committing does
+    not expire it; the caller commits.
+    """
+    stmt = update(model).where(*criteria)
+    if versions is not None:
+        stmt = stmt.where(model.version.in_(versions))
+    obj = db.execute(
+        stmt.values(**values, version=model.version + 1).returning(model)
+    ).scalar_one_or_none()
+
+    if obj is None:
+        # Only failed updates pay for a second query, to tell 404 from 412
+        if versions is not None and db.scalar(select(model.version).where(*criteria)):
+            raise HTTPException(
+                status_code=412,
+                detail="Resource was modified by another request; fetch it again and retry",
+            )
+        raise HTTPException(status_code=404, detail=not_found)
+
+    db.expunge(obj)
+    return obj
+
+
+def insert_unique(db: Session, model, values: dict, conflict: str, **on_conflict):
+    """
+    ``INSERT ... ON CONFLICT DO NOTHING RETURNING`` in one statement, relying
+    on the table's unique constraints instead of an existence check first.
+
+    Raises 400 with ``conflict`` if the row already exists. ``on_conflict``
+    (e.g. ``index_elements``/``index_where``) narrows which constraint counts.
+    Like ``update_versioned`` the row comes back detached and the caller commits.
+    """
+    obj = db.execute(
+        pg_insert(model)
+        .values(**values)
+        .on_conflict_do_nothing(**on_conflict)
+        .returning(model)
+    ).scalar_one_or_none()
+    if obj is None:
+        raise HTTPException(status_code=400, detail=conflict)
+
+    db.expunge(obj)
+    return obj
+
+
+def insert_absent(db: Session, model, values: dict, criteria, conflict: str):
+    """
+    ``INSERT ... SELECT ... WHERE NOT EXISTS (...) RETURNING`` in one statement,
+    for uniqueness no constraint can enforce, such as across the partitions
+    of a partitioned table.
+
+    Raises 400 with ``conflict`` if a row matching ``criteria`` exists. Unlike
+    ``insert_unique`` this does not stop two concurrent inserts on its own:
+    the caller must already hold a row lock that serialises them.
+    """
+    columns = list(values)
+    rows = select(
+        *(literal(value, getattr(model, column).type) for column, value in values.items())
+    ).where(~select(model).where(*criteria).exists())
+    obj = db.execute(
+        insert(model).from_select(columns, rows).returning(model)
+    ).scalar_one_or_none()
+    if obj is None:
+        raise HTTPException(status_code=400, detail=conflict)
+
+    db.expunge(obj)
+    return obj
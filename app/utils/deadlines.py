@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from typing import NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Deadline(NamedTuple):
+    statement_ms: int
+    lock_ms: int
+
+
+# Set on every PostgreSQL connection at connect time (app/database.py)
+DEFAULT_DEADLINE = Deadline(settings.db_statement_timeout_ms, settings.db_lock_timeout_ms)
+
+# Routes whose queries get a different statement_timeout/lock_timeout than
+# the connection default, keyed by method and route path like QUERY_BUDGETS.
+# Applied with SET LOCAL, so they end with the transaction.
+ROUTE_DEADLINES = {
+    # Interactive circulation: a slow lookup (e.g. a title pattern in
+    # return_book) or a long row-lock wait fails fast instead of holding
+    # the connection
+    ("POST", "/issued-books/"): Deadline(2000, 1000),
+    ("POST", "/issued-books/return"): Deadline(2000, 1000),
+    ("POST", "/holds/"): Deadline(2000, 1000),
+    ("DELETE", "/holds/{hold_id}"): Deadline(2000, 1000),
+    # Catalog reads take no row locks
+    ("GET", "/books/"): Deadline(2000, DEFAULT_DEADLINE.lock_ms),
+    ("GET", "/books/{book_name}"): Deadline(2000, DEFAULT_DEADLINE.lock_ms),
+    ("POST", "/books/batch"): Deadline(2000, DEFAULT_DEADLINE.lock_ms),
+    # Each FETCH of the export's server-side cursor is one statement, but
+    # the first has to start the scan over the whole date range
+    ("GET", "/exports/circulation"): Deadline(30000, DEFAULT_DEADLINE.lock_ms),
+}
+
+
+def route_deadline(scope) -> Deadline:
+    """The deadline of the route matched for ``scope``, or the connection default."""
+    route = scope.get("route")
+    if route is None:
+        return DEFAULT_DEADLINE
+    return ROUTE_DEADLINES.get((scope["method"], route.path), DEFAULT_DEADLINE)
+
+
+def apply_deadline(db: Session, scope):
+    """Give every transaction of ``db`` the deadline of the request's route."""
+    deadline = route_deadline(scope)
+    if deadline != DEFAULT_DEADLINE:
+        db.info["deadline"] = deadline
+
+
+@event.listens_for(Session, "after_begin")
+def _set_deadline(session, transaction, connection):
+    deadline = session.info.get("deadline")
+    if deadline is None or connection.dialect.name != "postgresql":
+        return
+    # On the DBAPI cursor, so the SET is not counted against the route's
+    # query budget; values are integers from ROUTE_DEADLINES, not user input
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            f"SET LOCAL statement_timeout = {int(deadline.statement_ms)}; "
+            f"SET LOCAL lock_timeout = {int(deadline.lock_ms)}"
+        )
+    finally:
+        cursor.close()
+
+
+class RequestConnections:
+    """The DBAPI connections a request currently has checked out of any pool."""
+
+    def __init__(self):
+        self.connections = set()
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def add(self, dbapi_connection):
+        with self._lock:
+            self.connections.add(dbapi_connection)
+
+    def discard(self, dbapi_connection):
+        # Waits for a cancel in progress, so a connection is never cancelled
+        # after it went back to the pool for another request to use
+        with self._lock:
+            self.connections.discard(dbapi_connection)
+
+    def cancel(self):
+        """Cancel the statement running on each connection (psycopg2 ``cancel()``)."""
+        with self._lock:
+            self.cancelled = True
+            for dbapi_connection in self.connections:
+                cancel = getattr(dbapi_connection, "cancel", None)
+                if cancel is None:
+                    continue
+                try:
+                    cancel()
+                except Exception:
+                    logger.warning("Could not cancel a statement", exc_info=True)
+
+
+_request_connections = contextvars.ContextVar("request_connections", default=None)
+
+
+def cancelled_by_client() -> bool:
+    """True inside a request whose statements were cancelled because its client left."""
+    connections = _request_connections.get()
+    return connections is not None and connections.cancelled
+
+
+@event.listens_for(Pool, "checkout")
+def _track_checkout(dbapi_connection, connection_record, connection_proxy):
+    # Handlers run in the threadpool with a copy of the request's context, so
+    # they all see the same RequestConnections object
+    connections = _request_connections.get()
+    if connections is not None:
+        connections.add(dbapi_connection)
+
+
+@event.listens_for(Pool, "checkin")
+def _track_checkin(dbapi_connection, connection_record):
+    connections = _request_connections.get()
+    if connections is not None and dbapi_connection is not None:
+        connections.discard(dbapi_connection)
+
+
+def _has_body(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"transfer-encoding" or (name == b"content-length" and value != b"0"):
+            return True
+    return False
+
+
+class DisconnectCancelMiddleware:
+    """
+    Cancel a request's running statements when its client disconnects, so
+    an abandoned request frees its connection instead of holding it until
+    its statement finishes or times out.
+
+    Once the request body has been read, this middleware is the only reader
+    of ``receive``: it waits for ``http.disconnect`` while the handler runs,
+    and later ``receive`` calls from the app (e.g. a streaming response
+    listening for the disconnect) are answered from the same state.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        connections = RequestConnections()
+        token = _request_connections.set(connections)
+        has_body = _has_body(scope)
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+        empty_body_sent = False
+        response_complete = False
+        if not has_body:
+            # The watcher consumes the empty request message; the app gets a copy
+            body_read.set()
+
+        async def app_receive():
+            nonlocal empty_body_sent
+            if not body_read.is_set():
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                elif not message.get("more_body", False):
+                    body_read.set()
+                return message
+            if not has_body and not empty_body_sent:
+                empty_body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def tracking_send(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        async def watch():
+            await body_read.wait()
+            while not disconnected.is_set():
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+            if not response_complete:
+                await run_in_threadpool(connections.cancel)
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await self.app(scope, app_receive, tracking_send)
+        except Exception:
+            if not connections.cancelled:
+                raise
+            # Nobody is left to receive the error response
+            logger.info("%s %s cancelled: client disconnected", scope["method"], scope["path"])
+        finally:
+            watcher.cancel()
+            _request_connections.reset(token)
@@ -1,27 +1,79 @@
+import logging
+import queue
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.config import get_settings
+from app.utils.circuit_breaker import CircuitOpenError, smtp_breaker
 
-EMAIL_HOST = os.getenv("EMAIL_HOST")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 
-def send_email(to_email: str, subject: str, body: str):
+def send_email(to_email: str, subject: str, body: str) -> bool:
+    """Send one email; False if it failed or SMTP's circuit breaker is open."""
+    try:
+        smtp_breaker.before_call()
+    except CircuitOpenError:
+        return False
+
     msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = EMAIL_USER
+    msg["From"] = settings.email_user
     msg["To"] = to_email
     msg.set_content(body)
 
     try:
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
+        with smtplib.SMTP(
+            settings.email_host, settings.email_port, timeout=settings.email_timeout_seconds
+        ) as server:
             server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
+            server.login(settings.email_user, settings.email_password)
             server.send_message(msg)
     except Exception as e:
-        print("Failed to send email:", e)
+        smtp_breaker.record_failure()
+        logger.warning("Failed to send email: %s", e)
+        return False
+    smtp_breaker.record_success()
+    return True
+
+
+# Outgoing mail queue, drained by a single background thread so callers
+# (request handlers, scheduled jobs) never wait on SMTP.
+_email_queue: "queue.Queue[tuple]" = queue.Queue()
+_worker: threading.Thread = None
+_worker_lock = threading.Lock()
+
+
+def _drain_queue():
+    while True:
+        to_email, subject, body = _email_queue.get()
+        try:
+            # Hold queued mail while SMTP is down instead of dropping it
+            while not send_email(to_email, subject, body) and smtp_breaker.is_open:
+                time.sleep(smtp_breaker.retry_after or 1)
+        finally:
+            _email_queue.task_done()
+
+
+def enqueue_email(to_email: str, subject: str, body: str):
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_drain_queue, name="email-queue", daemon=True
+            )
+            _worker.start()
+    _email_queue.put((to_email, subject, body))
+
+
+def flush_email_queue(timeout: float) -> bool:
+    """Wait up to ``timeout`` seconds for queued emails to be sent."""
+    deadline = time.monotonic() + timeout
+    while _email_queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
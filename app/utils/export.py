@@ -0,0 +1,160 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import Iterator, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV is always available
+    pa = None
+    pq = None
+
+settings = get_settings()
+
+CIRCULATION_COLUMNS = (
+    "issued_book_id",
+    "issue_date",
+    "due_date",
+    "return_date",
+    "is_returned",
+    "student_id",
+    "student_name",
+    "student_email",
+    "book_id",
+    "book_title",
+    "fine_amount",
+    "fine_date",
+)
+
+
+def month_windows(start: datetime, end: datetime) -> Iterator[Tuple[datetime, datetime]]:
+    """Split ``[start, end)`` into calendar-month ranges."""
+    lower = start
+    while lower < end:
+        month_start = lower.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        upper = (month_start + timedelta(days=32)).replace(day=1)
+        yield lower, min(upper, end)
+        lower = upper
+
+
+def _circulation_query(lower: datetime, upper: datetime):
+    return (
+        select(
+            models.IssuedBook.id.label("issued_book_id"),
+            models.IssuedBook.issue_date,
+            models.IssuedBook.due_date,
+            models.IssuedBook.return_date,
+            models.IssuedBook.is_returned,
+            models.User.id.label("student_id"),
+            models.User.name.label("student_name"),
+            models.User.email.label("student_email"),
+            models.Book.id.label("book_id"),
+            models.Book.title.label("book_title"),
+            models.Fine.amount.label("fine_amount"),
+            models.Fine.date.label("fine_date"),
+        )
+        .join(models.User, models.IssuedBook.student_id == models.User.id)
+        .join(models.Book, models.IssuedBook.book_id == models.Book.id)
+        .outerjoin(models.Fine, models.Fine.issued_book_id == models.IssuedBook.id)
+        .where(
+            models.IssuedBook.issue_date >= lower,
+            models.IssuedBook.issue_date < upper,
+        )
+        .order_by(models.IssuedBook.issue_date, models.IssuedBook.id)
+    )
+
+
+def circulation_batches(db: Session, start: datetime, end: datetime):
+    """
+    Yield lists of circulation rows, one month-sized range query at a time,
+    each read through a server-side cursor so no query result is buffered.
+    """
+    for lower, upper in month_windows(start, end):
+        result = db.execute(
+            _circulation_query(lower, upper).execution_options(
+                stream_results=True, yield_per=settings.stream_batch_size
+            )
+        )
+        for rows in result.partitions():
+            yield rows
+
+
+def circulation_csv(db: Session, start: datetime, end: datetime) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CIRCULATION_COLUMNS)
+    try:
+        for rows in circulation_batches(db, start, end):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode()
+    finally:
+        db.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting bytes until they are drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema():
+    return pa.schema(
+        [
+            ("issued_book_id", pa.string()),
+            ("issue_date", pa.timestamp("us")),
+            ("due_date", pa.timestamp("us")),
+            ("return_date", pa.timestamp("us")),
+            ("is_returned", pa.bool_()),
+            ("student_id", pa.string()),
+            ("student_name", pa.string()),
+            ("student_email", pa.string()),
+            ("book_id", pa.string()),
+            ("book_title", pa.string()),
+            ("fine_amount", pa.decimal128(10, 2)),
+            ("fine_date", pa.timestamp("us")),
+        ]
+    )
+
+
+def circulation_parquet(db: Session, start: datetime, end: datetime) -> Iterator[bytes]:
+    """Write one Parquet row group per fetched batch and stream bytes as they are produced."""
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in circulation_batches(db, start, end):
+            columns = list(zip(*rows))
+            for uuid_column in (0, 5, 8):
+                columns[uuid_column] = [str(value) for value in columns[uuid_column]]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    finally:
+        db.close()
@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+
+class SparseFields:
+    """
+    ``fields=`` query parameter for list routes. Resolves to the requested
+    field names (validated against ``columns``), or ``None`` for the full
+    response.
+    """
+
+    def __init__(self, columns: Dict[str, object]):
+        self.columns = columns
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(
+            default=None,
+            description="Comma separated fields to return, e.g. fields=title,quantity",
+        ),
+    ) -> Optional[List[str]]:
+        if fields is None:
+            return None
+
+        names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in names if name not in self.columns]
+        if not names or unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(self.columns)}",
+            )
+        return names
+
+    def columns_for(self, names: List[str]):
+        return [self.columns[name].label(name) for name in names]
+
+
+# Run a column-only select and return plain rows, skipping ORM entities and response models
+def sparse_response(db: Session, stmt):
+    rows = [dict(row) for row in db.execute(stmt).mappings()]
+    return JSONResponse(content=jsonable_encoder(rows))
+
+
+# The same for rows already in memory, such as reference data
+def sparse_objects_response(objects, names: List[str]):
+    rows = [{name: getattr(obj, name) for name in names} for obj in objects]
+    return JSONResponse(content=jsonable_encoder(rows))
@@ -0,0 +1,180 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import HoldStatusEnum
+from app.utils.availability import publish_availability
+from app.utils.background import PeriodicJob
+from app.utils.email_service import enqueue_email
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Ready holds expired per transaction by the expiry job
+EXPIRY_BATCH_SIZE = 100
+
+
+class Allocation(NamedTuple):
+    student_email: str
+    student_name: str
+    book_title: str
+    expires_at: datetime
+
+
+def _waiting_holds(db: Session, book_id, limit: int) -> list:
+    """
+    The oldest ``limit`` waiting holds on ``book_id``, locked. ``SKIP LOCKED``
+    lets concurrent returns of the same title each take a different hold
+    instead of queueing on the head row.
+    """
+    return db.execute(
+        select(
+            models.BookHold.id,
+            models.User.email,
+            models.User.name,
+            models.Book.title,
+        )
+        .join(models.User, models.BookHold.student_id == models.User.id)
+        .join(models.Book, models.BookHold.book_id == models.Book.id)
+        .where(
+            models.BookHold.book_id == book_id,
+            models.BookHold.status == HoldStatusEnum.WAITING,
+        )
+        .order_by(models.BookHold.created_at, models.BookHold.id)
+        .limit(limit)
+        .with_for_update(of=models.BookHold, skip_locked=True)
+    ).all()
+
+
+def _set_aside(db: Session, holds: list, now: datetime) -> List[Allocation]:
+    expires_at = now + timedelta(hours=settings.hold_pickup_hours)
+    db.execute(
+        update(models.BookHold)
+        .where(models.BookHold.id.in_([hold.id for hold in holds]))
+        .values(status=HoldStatusEnum.READY, ready_at=now, expires_at=expires_at)
+    )
+    return [Allocation(hold.email, hold.name, hold.title, expires_at) for hold in holds]
+
+
+def lock_book(db: Session, *criteria):
+    """
+    Lock the book row matching ``criteria`` and return its id and quantity.
+    place_hold checks the quantity under this lock, so whoever shelves a
+    copy while holding it cannot miss a hold being placed.
+    """
+    return db.execute(
+        select(models.Book.id, models.Book.quantity).where(*criteria).with_for_update()
+    ).first()
+
+
+def allocate_copy(db: Session, book_id, now: datetime = None) -> Optional[Allocation]:
+    """
+    Hand a returned or released copy of ``book_id`` to the oldest waiting
+    hold, or put it back on the shelf when nobody is waiting.
+
+    Runs in the caller's transaction. Returns the allocation to notify once
+    the caller has committed.
+    """
+    now = now or datetime.utcnow()
+    holds = _waiting_holds(db, book_id, 1)
+    if not holds:
+        # A hold may be committing right now: wait for its place_hold, then look again
+        lock_book(db, models.Book.id == book_id)
+        holds = _waiting_holds(db, book_id, 1)
+
+    if not holds:
+        book = db.execute(
+            update(models.Book)
+            .where(models.Book.id == book_id)
+            .values(quantity=models.Book.quantity + 1, version=models.Book.version + 1)
+            .returning(models.Book.title, models.Book.quantity)
+        ).one()
+        publish_availability(db, book.title, book.quantity)
+        return None
+
+    return _set_aside(db, holds, now)[0]
+
+
+def allocate_copies(db: Session, book_id, copies: int, now: datetime = None) -> List[Allocation]:
+    """
+    Set aside up to ``copies`` new copies of ``book_id`` for the oldest
+    waiting holds. The caller holds the book's row lock (``lock_book``) and
+    shelves the copies not allocated.
+    """
+    now = now or datetime.utcnow()
+    holds = _waiting_holds(db, book_id, copies)
+    if not holds:
+        return []
+    return _set_aside(db, holds, now)
+
+
+def notify_hold_ready(allocation: Optional[Allocation]):
+    if allocation is None:
+        return
+    enqueue_email(
+        to_email=allocation.student_email,
+        subject="Your Library Hold Is Ready",
+        body=(
+            f"Hello {allocation.student_name},\n\nA copy of '{allocation.book_title}' "
+            f"is set aside for you until "
+            f"{allocation.expires_at.strftime('%Y-%m-%d %H:%M')} UTC. "
+            f"Issue it before then or it passes to the next student in the queue."
+        ),
+    )
+
+
+def expire_ready_holds(db: Session, now: datetime = None) -> int:
+    """
+    Expire ready holds that were not collected in time and pass each copy on
+    to the next student waiting, one batch (and one transaction) at a time.
+    """
+    now = now or datetime.utcnow()
+    expired = 0
+
+    while True:
+        batch = db.execute(
+            select(models.BookHold.id, models.BookHold.book_id)
+            .where(
+                models.BookHold.status == HoldStatusEnum.READY,
+                models.BookHold.expires_at < now,
+            )
+            .order_by(models.BookHold.expires_at)
+            .limit(EXPIRY_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not batch:
+            break
+
+        db.execute(
+            update(models.BookHold)
+            .where(models.BookHold.id.in_([hold.id for hold in batch]))
+            .values(status=HoldStatusEnum.EXPIRED)
+        )
+        allocations = [allocate_copy(db, hold.book_id, now) for hold in batch]
+        db.commit()
+
+        for allocation in allocations:
+            notify_hold_ready(allocation)
+        expired += len(batch)
+        if len(batch) < EXPIRY_BATCH_SIZE:
+            break
+
+    return expired
+
+
+def run_hold_expiry():
+    with SessionLocal() as db:
+        expired = expire_ready_holds(db)
+    if expired:
+        logger.info("Expired %s uncollected holds", expired)
+
+
+hold_expiry = PeriodicJob(
+    "hold-expiry", run_hold_expiry, settings.hold_expiry_interval_seconds
+)
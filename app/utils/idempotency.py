@@ -0,0 +1,240 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+
+from app import models
+from app.config import get_settings
+from app.database import SessionLocal
+from app.utils.background import PeriodicJob
+
+settings = get_settings()
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+
+# POST routes whose first response is stored and replayed for retries
+IDEMPOTENT_ROUTES = {
+    "/authors/",
+    "/books/",
+    "/category/",
+    "/course/",
+    "/issued-books/",
+    "/issued-books/return",
+    "/holds/",
+    "/users/register",
+}
+
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _caller(scope) -> bytes:
+    # Keys are scoped per caller so clients can't replay each other's responses
+    authorization = _header(scope, b"authorization")
+    if authorization:
+        return authorization
+    client = scope.get("client")
+    return client[0].encode() if client else b""
+
+
+def _claim(record_id: str, request_hash: str, now: datetime):
+    """
+    Reserve ``record_id`` for this request, claimed at ``now``. Returns
+    ``None`` when the caller should process the request, otherwise the
+    existing record.
+    """
+    with SessionLocal() as db:
+        inserted = db.execute(
+            pg_insert(models.IdempotencyKey)
+            .values(
+                id=record_id,
+                request_hash=request_hash,
+                created_at=now,
+                claimed_at=now,
+                expires_at=now + timedelta(hours=settings.idempotency_key_ttl_hours),
+            )
+            .on_conflict_do_nothing(index_elements=[models.IdempotencyKey.id])
+            .returning(models.IdempotencyKey.id)
+        ).scalar()
+        if inserted:
+            db.commit()
+            return None
+
+        # An expired key, or a claim whose request died before storing a
+        # response: take it over atomically, unless another retry just did
+        lease_expired = now - timedelta(seconds=settings.idempotency_claim_lease_seconds)
+        stale = or_(
+            models.IdempotencyKey.expires_at < now,
+            models.IdempotencyKey.status_code.is_(None)
+            & (models.IdempotencyKey.claimed_at < lease_expired),
+        )
+        record = db.get(models.IdempotencyKey, record_id)
+        if record is not None and (
+            record.expires_at < now
+            or (record.status_code is None and record.claimed_at < lease_expired)
+        ):
+            taken = db.execute(
+                update(models.IdempotencyKey)
+                .where(models.IdempotencyKey.id == record_id, stale)
+                .values(
+                    request_hash=request_hash,
+                    status_code=None,
+                    content_type=None,
+                    response_body=None,
+                    created_at=now,
+                    claimed_at=now,
+                    expires_at=now + timedelta(hours=settings.idempotency_key_ttl_hours),
+                )
+            ).rowcount
+            db.commit()
+            if taken:
+                return None
+            record = db.get(models.IdempotencyKey, record_id, populate_existing=True)
+        db.expunge_all()
+        return record
+
+
+def _store(record_id: str, claimed_at: datetime, status_code: int, content_type: str, body: bytes):
+    # Only while the claim is still ours: after the lease a retry may have taken it over
+    owned = (
+        models.IdempotencyKey.id == record_id,
+        models.IdempotencyKey.claimed_at == claimed_at,
+    )
+    with SessionLocal() as db:
+        if status_code >= 500:
+            # Server errors are not final; let the client retry for real
+            db.execute(delete(models.IdempotencyKey).where(*owned))
+        else:
+            db.execute(
+                update(models.IdempotencyKey)
+                .where(*owned)
+                .values(
+                    status_code=status_code,
+                    content_type=content_type,
+                    response_body=body,
+                )
+            )
+        db.commit()
+
+
+class IdempotencyMiddleware:
+    """
+    ``Idempotency-Key`` support for create/issue/return endpoints: the first
+    response for a key is stored and replayed verbatim for retries, so a
+    retried request never re-runs its handler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in IDEMPOTENT_ROUTES
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key = _header(scope, IDEMPOTENCY_HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the request body so it can be hashed and then replayed to the app
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        record_id = hashlib.sha256(
+            b"\0".join([_caller(scope), scope["path"].encode(), key])
+        ).hexdigest()
+        request_hash = hashlib.sha256(body).hexdigest()
+
+        claimed_at = datetime.utcnow()
+        record = await run_in_threadpool(_claim, record_id, request_hash, claimed_at)
+        if record is not None:
+            if record.request_hash != request_hash:
+                response = JSONResponse(
+                    status_code=422,
+                    content={"detail": "Idempotency-Key was already used with a different request body"},
+                )
+            elif record.status_code is None:
+                response = JSONResponse(
+                    status_code=409,
+                    content={"detail": "A request with this Idempotency-Key is still in progress"},
+                    headers={"Retry-After": "1"},
+                )
+            else:
+                response = Response(
+                    content=record.response_body,
+                    status_code=record.status_code,
+                    media_type=record.content_type,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        content_type = None
+        response_chunks = []
+
+        async def capture_send(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", []):
+                    if name == b"content-type":
+                        content_type = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            await run_in_threadpool(
+                _store,
+                record_id,
+                claimed_at,
+                status_code,
+                content_type,
+                b"".join(response_chunks),
+            )
+
+
+def purge_expired_idempotency_keys():
+    with SessionLocal() as db:
+        db.execute(
+            delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.expires_at < datetime.utcnow()
+            )
+        )
+        db.commit()
+
+
+idempotency_purge = PeriodicJob(
+    "idempotency-purge", purge_expired_idempotency_keys, 3600
+)
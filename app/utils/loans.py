@@ -0,0 +1,53 @@
+from datetime import datetime
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.utils.pagination import KeysetPagination
+
+
+def loan_history(db: Session, student_id, page: KeysetPagination) -> schemas.LoanPage:
+    """
+    One page of a student's loans, newest first, with any fine charged.
+
+    Keyset order on ``(issue_date, id)`` matches
+    ``ix_issued_books_student_issue_date``; one extra row is fetched to tell
+    whether another page follows.
+    """
+    stmt = (
+        select(
+            models.IssuedBook.id,
+            models.Book.title.label("book_title"),
+            models.IssuedBook.issue_date,
+            models.IssuedBook.due_date,
+            models.IssuedBook.return_date,
+            models.IssuedBook.is_returned,
+            models.Fine.amount.label("fine_amount"),
+        )
+        .join(models.Book, models.IssuedBook.book_id == models.Book.id)
+        .outerjoin(models.Fine, models.Fine.issued_book_id == models.IssuedBook.id)
+        .where(models.IssuedBook.student_id == student_id)
+        .order_by(models.IssuedBook.issue_date.desc(), models.IssuedBook.id.desc())
+        .limit(page.limit + 1)
+    )
+
+    after = page.after()
+    if after is not None:
+        try:
+            issue_date, loan_id = datetime.fromisoformat(after[0]), UUID(after[1])
+        except (TypeError, ValueError, IndexError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(
+            tuple_(models.IssuedBook.issue_date, models.IssuedBook.id)
+            < tuple_(issue_date, loan_id)
+        )
+
+    rows = db.execute(stmt).mappings().all()
+    items = [schemas.LoanResponse(**row) for row in rows[: page.limit]]
+    next_cursor = None
+    if len(rows) > page.limit:
+        next_cursor = KeysetPagination.encode(items[-1].issue_date, items[-1].id)
+    return schemas.LoanPage(items=items, next_cursor=next_cursor)
@@ -0,0 +1,187 @@
+import enum
+import uuid
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Optional
+
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.config import get_settings
+from app.database import read_session
+from app.utils.pagination import Pagination
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; NDJSON is always available
+    msgpack = None
+
+settings = get_settings()
+
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+
+
+def _accepted(header: str) -> list:
+    """Media types / encodings from an Accept-style header, skipping q=0."""
+    accepted = []
+    for part in header.split(","):
+        value, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0
+        if value and quality > 0:
+            accepted.append(value.lower())
+    return accepted
+
+
+def streaming_media_type(request: Request) -> Optional[str]:
+    accepted = _accepted(request.headers.get("accept", ""))
+    if NDJSON in accepted:
+        return NDJSON
+    if MSGPACK in accepted or "application/x-msgpack" in accepted:
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="MessagePack is not available")
+        return MSGPACK
+    return None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def stream_rows(
+    request: Request,
+    stmt,
+    pagination: Pagination,
+    media_type: str,
+    to_dict: Callable = dict,
+):
+    """
+    Stream the rows of ``stmt`` as NDJSON or MessagePack while they are
+    fetched, so memory stays flat regardless of result size. The default page
+    size does not apply; ``limit`` is honoured only when sent explicitly.
+    """
+    stmt = stmt.offset(pagination.offset)
+    if "limit" in request.query_params:
+        stmt = stmt.limit(pagination.limit)
+
+    if media_type == MSGPACK:
+        packer = msgpack.Packer(default=_default)
+        encode = packer.pack
+    else:
+        def encode(row):
+            return orjson.dumps(row, default=_default) + b"\n"
+
+    # The request's own session is closed before the body is sent, so the
+    # generator owns its session for the lifetime of the stream.
+    db = read_session(request)
+
+    def generate():
+        try:
+            result = db.execute(
+                stmt.execution_options(yield_per=settings.stream_batch_size)
+            ).mappings()
+            for rows in result.partitions():
+                yield b"".join(encode(to_dict(row)) for row in rows)
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type=media_type)
+
+
+class CompressionMiddleware:
+    """
+    gzip / brotli response compression. Complete responses under
+    ``compression_minimum_size`` are left alone; streamed responses are
+    compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = minimum_size or settings.compression_minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encodings = _accepted(accept)
+        if brotli is not None and "br" in encodings:
+            encoding = "br"
+        elif "gzip" in encodings:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def compressing_send(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = list(start.get("headers", []))
+                already_encoded = any(name == b"content-encoding" for name, _ in headers)
+                if already_encoded or (not more_body and len(body) < self.minimum_size):
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+
+                compressor = (
+                    brotli.Compressor()
+                    if encoding == "br"
+                    else zlib.compressobj(6, zlib.DEFLATED, 31)
+                )
+                headers = [(name, value) for name, value in headers if name != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+                await send({**start, "headers": headers})
+
+            if encoding == "br":
+                chunk = compressor.process(body)
+                if more_body:
+                    chunk += compressor.flush()
+                else:
+                    chunk += compressor.finish()
+            else:
+                chunk = compressor.compress(body)
+                chunk += compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
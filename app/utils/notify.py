@@ -0,0 +1,92 @@
+import logging
+import select as select_module
+import threading
+from collections import defaultdict
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the stop flag while no notification arrives
+POLL_SECONDS = 5
+RECONNECT_SECONDS = 2
+
+
+def notify(db: Session, channel: str, payload: str):
+    """
+    Queue a PostgreSQL ``NOTIFY``. It is delivered to every listening worker,
+    this one included, only if and when ``db``'s transaction commits.
+    """
+    db.execute(select(func.pg_notify(channel, payload)))
+
+
+class PgListener:
+    """
+    One dedicated connection per worker that ``LISTEN``s on every subscribed
+    channel and hands payloads to callbacks on a daemon thread. Callbacks
+    must be quick and thread-safe; hand work to an event loop or queue.
+    """
+
+    def __init__(self):
+        self._callbacks = defaultdict(list)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        """Register before ``start``; channels added later are picked up on reconnect."""
+        self._callbacks[channel].append(callback)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if get_engine().dialect.name != "postgresql":
+            logger.warning("LISTEN/NOTIFY needs PostgreSQL; cross-worker notifications are off")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.warning("Notification listener lost its connection", exc_info=True)
+                self._stop.wait(RECONNECT_SECONDS)
+
+    def _listen(self):
+        # Detached from the pool: this connection is held for the worker's lifetime
+        proxy = get_engine().raw_connection()
+        proxy.detach()
+        conn = proxy.driver_connection
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for channel in list(self._callbacks):
+                    cursor.execute(f'LISTEN "{channel}"')
+
+            while not self._stop.is_set():
+                if select_module.select([conn], [], [], POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    for callback in self._callbacks.get(notification.channel, ()):
+                        try:
+                            callback(notification.payload)
+                        except Exception:
+                            logger.exception("Notification callback for %s failed", notification.channel)
+        finally:
+            proxy.close()
+
+
+pg_listener = PgListener()
@@ -0,0 +1,190 @@
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import (
+    Date,
+    DateTime,
+    Integer,
+    cast,
+    func,
+    literal,
+    select,
+    tuple_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.database import get_engine
+from app.utils.background import PeriodicJob, advisory_lock
+from app.utils.email_service import enqueue_email
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Loans due within this window get a "due soon" reminder
+REMINDER_WINDOW = timedelta(days=1)
+# Only one reminder per loan within this interval
+REMINDER_INTERVAL = timedelta(days=1)
+
+# Arbitrary, app-wide constant identifying the scanner's advisory lock
+OVERDUE_SCANNER_LOCK_KEY = 7_202_601
+
+
+def calculate_fine(due_date: datetime, returned_on: datetime) -> Optional[Decimal]:
+    late_days = (returned_on.date() - due_date.date()).days
+    if late_days <= 0:
+        return None
+    return Decimal(late_days) * settings.fine_per_day
+
+
+def _loans(batch: list):
+    """
+    WHERE clause for the loans of ``batch``. Naming their issue dates lets
+    PostgreSQL prune the issued_books partitions that hold none of them.
+    """
+    return (
+        models.IssuedBook.id.in_([loan.id for loan in batch]),
+        models.IssuedBook.issue_date.in_(list({loan.issue_date for loan in batch})),
+    )
+
+
+def _accrue_fines(db: Session, batch: list, now: datetime):
+    """
+    Insert or refresh the fine of every overdue loan in ``batch`` in one
+    statement. Loans returned since the batch was read are skipped: the row
+    lock waits for a concurrent return_book and re-checks ``is_returned``,
+    so the fine it settled is never overwritten.
+    """
+    late_days = type_coerce(
+        cast(now, Date) - cast(models.IssuedBook.due_date, Date), Integer
+    )
+    rows = select(
+        func.gen_random_uuid(),
+        late_days * settings.fine_per_day,
+        literal(now, DateTime),
+        models.IssuedBook.id,
+    ).where(
+        *_loans(batch),
+        models.IssuedBook.is_returned.is_(False),
+        cast(models.IssuedBook.due_date, Date) < cast(now, Date),
+    ).with_for_update(of=models.IssuedBook)
+    stmt = pg_insert(models.Fine).from_select(
+        ["id", "amount", "date", "issued_book_id"], rows
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Fine.issued_book_id],
+        set_={"amount": stmt.excluded.amount, "date": stmt.excluded.date},
+    )
+    db.execute(stmt)
+
+
+def _mark_reminders(db: Session, batch: list, now: datetime) -> list:
+    """
+    Stamp ``last_reminder_at`` on the loans due a reminder and return their
+    emails, to be queued once the transaction has committed.
+    """
+    reminded = []
+    emails = []
+    for loan in batch:
+        if loan.last_reminder_at and loan.last_reminder_at > now - REMINDER_INTERVAL:
+            continue
+
+        fine = calculate_fine(loan.due_date, now)
+        if fine:
+            subject = "Library Book Overdue"
+            body = (
+                f"Hello {loan.student_name},\n\n'{loan.book_title}' was due on "
+                f"{loan.due_date.strftime('%Y-%m-%d')}. Your fine so far is {fine}."
+            )
+        else:
+            subject = "Library Book Due Reminder"
+            body = (
+                f"Hello {loan.student_name},\n\n'{loan.book_title}' is due on "
+                f"{loan.due_date.strftime('%Y-%m-%d')}. Please return it on time."
+            )
+        emails.append(dict(to_email=loan.student_email, subject=subject, body=body))
+        reminded.append(loan)
+
+    if reminded:
+        db.execute(
+            update(models.IssuedBook)
+            .where(*_loans(reminded))
+            .values(last_reminder_at=now)
+        )
+    return emails
+
+
+def scan_overdue_loans(db: Session, now: datetime = None, batch_size: int = None):
+    """
+    Walk open loans due before ``now + REMINDER_WINDOW`` in keyset order over
+    ``ix_issued_books_open_due_date``, accruing fines and queueing reminders
+    one batch (and one transaction) at a time.
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.overdue_scan_batch_size
+    cursor = None
+    processed = 0
+
+    while True:
+        stmt = (
+            select(
+                models.IssuedBook.id,
+                models.IssuedBook.issue_date,
+                models.IssuedBook.due_date,
+                models.IssuedBook.last_reminder_at,
+                models.User.email.label("student_email"),
+                models.User.name.label("student_name"),
+                models.Book.title.label("book_title"),
+            )
+            .join(models.User, models.IssuedBook.student_id == models.User.id)
+            .join(models.Book, models.IssuedBook.book_id == models.Book.id)
+            .where(
+                models.IssuedBook.is_returned.is_(False),
+                models.IssuedBook.due_date < now + REMINDER_WINDOW,
+            )
+            .order_by(models.IssuedBook.due_date, models.IssuedBook.id)
+            .limit(batch_size)
+        )
+        if cursor is not None:
+            stmt = stmt.where(
+                tuple_(models.IssuedBook.due_date, models.IssuedBook.id)
+                > tuple_(*cursor)
+            )
+
+        batch = db.execute(stmt).all()
+        if not batch:
+            break
+
+        _accrue_fines(db, batch, now)
+        emails = _mark_reminders(db, batch, now)
+        db.commit()
+        for email in emails:
+            enqueue_email(**email)
+
+        processed += len(batch)
+        cursor = (batch[-1].due_date, batch[-1].id)
+        if len(batch) < batch_size:
+            break
+
+    return processed
+
+
+def run_overdue_scan():
+    with advisory_lock(get_engine(), OVERDUE_SCANNER_LOCK_KEY) as conn:
+        if conn is None:
+            logger.debug("Overdue scan skipped: another worker holds the lock")
+            return
+        with Session(bind=conn, autoflush=False) as db:
+            processed = scan_overdue_loans(db)
+        logger.info("Overdue scan processed %s open loans", processed)
+
+
+overdue_scanner = PeriodicJob(
+    "overdue-scanner", run_overdue_scan, settings.overdue_scan_interval_seconds
+)
@@ -1,4 +1,8 @@
-from fastapi import Query
+import base64
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, Query
 
 
 class Pagination:
@@ -9,3 +13,32 @@ class Pagination:
     ):
         self.limit = limit
         self.offset = offset
+
+
+class KeysetPagination:
+    """
+    Cursor pagination: ``cursor`` is the opaque ``next_cursor`` of the
+    previous page and encodes the sort key of its last row, so each page
+    seeks straight to its first row instead of skipping ``offset`` rows.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(default=20, ge=1, le=100, description="Number of items to return"),
+        cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+    @staticmethod
+    def encode(*key) -> str:
+        return base64.urlsafe_b64encode(orjson.dumps(key)).decode()
+
+    def after(self) -> Optional[list]:
+        """The sort key to continue after, as JSON values; ``None`` on the first page."""
+        if self.cursor is None:
+            return None
+        try:
+            return orjson.loads(base64.urlsafe_b64decode(self.cursor.encode()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
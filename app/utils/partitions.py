@@ -0,0 +1,206 @@
+import logging
+import re
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.config import get_settings
+from app.database import get_engine
+from app.utils.background import PeriodicJob, advisory_lock
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PARTITIONED_TABLE = "issued_books"
+ARCHIVE_SCHEMA = "archive"
+# Monthly partitions are named issued_books_pYYYY_MM
+PARTITION_NAME = re.compile(rf"^{PARTITIONED_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+# Arbitrary, app-wide constant identifying the maintenance job's advisory lock
+PARTITION_MAINTENANCE_LOCK_KEY = 7_202_602
+
+
+def _month(day) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITIONED_TABLE}_p{month:%Y_%m}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(
+        conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": PARTITIONED_TABLE},
+        ).scalar()
+    )
+
+
+def attached_partitions(conn: Connection) -> List[date]:
+    """Months with a partition attached to ``issued_books``, oldest first."""
+    names = conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": PARTITIONED_TABLE},
+    ).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def _lift_timeouts(conn: Connection):
+    """
+    For the rest of this transaction, run without the pool's
+    statement_timeout and wait up to ``partition_lock_timeout_ms`` for
+    locks: moving or archiving a month of loans takes longer than any
+    request, and ATTACH/DETACH queue behind in-flight loan queries.
+    """
+    conn.execute(text("SET LOCAL statement_timeout = 0"))
+    conn.execute(text(f"SET LOCAL lock_timeout = {int(settings.partition_lock_timeout_ms)}"))
+
+
+def _create_partition(conn: Connection, month: date):
+    name = partition_name(month)
+    # Bounds are computed dates, not user input; DDL takes no bind parameters
+    bounds = f"FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')"
+    in_month = f"issue_date >= '{month}' AND issue_date < '{_add_months(month, 1)}'"
+
+    # No partition covers the month yet, so any loans in it are in the
+    # default partition, and PostgreSQL refuses to create one over them
+    stranded = conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {PARTITIONED_TABLE} WHERE {in_month})")
+    ).scalar()
+    if not stranded:
+        conn.execute(text(f'CREATE TABLE "{name}" PARTITION OF {PARTITIONED_TABLE} {bounds}'))
+        return
+
+    # Build the partition beside the table, move the loans into it and attach
+    # it, in one transaction
+    logger.warning("Moving loans of %s out of the default partition", month.strftime("%Y-%m"))
+    conn.execute(
+        text(
+            f'CREATE TABLE "{name}" '
+            f"(LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {PARTITIONED_TABLE} WHERE {in_month} RETURNING *) "
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        )
+    )
+    conn.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION "{name}" {bounds}'))
+
+
+def ensure_partitions(conn: Connection, now: datetime = None) -> List[str]:
+    """
+    Create the partitions for this month and the next
+    ``partition_months_ahead``, so new loans never land in the default
+    partition; loans already there for one of those months are moved into
+    its new partition. Returns the names of the partitions created.
+    """
+    this_month = _month(now or datetime.utcnow())
+    existing = set(attached_partitions(conn))
+    created = []
+    for offset in range(settings.partition_months_ahead + 1):
+        month = _add_months(this_month, offset)
+        if month in existing:
+            continue
+        _lift_timeouts(conn)
+        _create_partition(conn, month)
+        conn.commit()
+        created.append(partition_name(month))
+    return created
+
+
+def archive_partitions(conn: Connection, now: datetime = None) -> List[str]:
+    """
+    Detach the partitions of months older than ``loan_archive_after_months``
+    and move them, with the fines of their loans, into the ``archive``
+    schema, one partition per transaction. A partition that still holds an
+    open loan is left attached. Returns the names of the partitions archived.
+
+    fines itself is not partitioned: it has one row per late loan, so it
+    stays small, and the overdue scanner's upsert needs the unique index on
+    issued_book_id alone, which a table partitioned by date cannot have.
+    """
+    cutoff = _add_months(
+        _month(now or datetime.utcnow()), -settings.loan_archive_after_months
+    )
+    archived = []
+    for month in attached_partitions(conn):
+        if month >= cutoff:
+            break
+        name = partition_name(month)
+        _lift_timeouts(conn)
+        open_loans = conn.execute(
+            text(f'SELECT EXISTS (SELECT 1 FROM "{name}" WHERE is_returned = false)')
+        ).scalar()
+        if open_loans:
+            logger.warning("Partition %s still has open loans; not archived", name)
+            conn.rollback()
+            continue
+
+        conn.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION "{name}"'))
+        conn.execute(text(f'ALTER TABLE "{name}" SET SCHEMA {ARCHIVE_SCHEMA}'))
+        loans = f'SELECT id FROM {ARCHIVE_SCHEMA}."{name}"'
+        conn.execute(
+            text(
+                f"INSERT INTO {ARCHIVE_SCHEMA}.fines "
+                f"SELECT * FROM fines WHERE issued_book_id IN ({loans})"
+            )
+        )
+        conn.execute(text(f"DELETE FROM fines WHERE issued_book_id IN ({loans})"))
+        if settings.loan_archive_tablespace:
+            # e.g. a tablespace on cheaper or compressed storage
+            conn.execute(
+                text(
+                    f'ALTER TABLE {ARCHIVE_SCHEMA}."{name}" '
+                    f'SET TABLESPACE "{settings.loan_archive_tablespace}"'
+                )
+            )
+        conn.commit()
+        archived.append(name)
+    return archived
+
+
+def run_partition_maintenance():
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        return
+    with advisory_lock(engine, PARTITION_MAINTENANCE_LOCK_KEY) as conn:
+        if conn is None:
+            logger.debug("Partition maintenance skipped: another worker holds the lock")
+            return
+        if not is_partitioned(conn):
+            logger.debug("%s is not partitioned; nothing to maintain", PARTITIONED_TABLE)
+            return
+        created = ensure_partitions(conn)
+        archived = archive_partitions(conn)
+    if created or archived:
+        logger.info(
+            "Loan partitions created: %s; archived: %s",
+            ", ".join(created) or "none",
+            ", ".join(archived) or "none",
+        )
+
+
+partition_maintenance = PeriodicJob(
+    "partition-maintenance",
+    run_partition_maintenance,
+    settings.partition_maintenance_interval_seconds,
+)
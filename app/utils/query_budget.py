@@ -0,0 +1,156 @@
+import contextvars
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import JSONResponse
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Most SQL statements a request may run before its response starts, keyed by
+# method and route path. Counts include authentication (one SELECT for the
+# current user). Queries a streamed body runs after the response has started
+# are not covered.
+QUERY_BUDGETS = {
+    ("GET", "/"): 0,
+    # Users
+    ("POST", "/users/register"): 1,
+    ("GET", "/users/all"): 1,
+    ("POST", "/users/batch"): 2,
+    ("GET", "/users/{user_id}/loans"): 3,
+    ("POST", "/users/login"): 1,
+    ("PUT", "/users/update-profile"): 2,
+    ("DELETE", "/users/delete-profile"): 3,
+    ("POST", "/users/logout"): 2,
+    # Authors
+    ("POST", "/authors/"): 2,
+    ("GET", "/authors/"): 1,
+    ("GET", "/authors/by-email/{email}"): 2,
+    ("POST", "/authors/batch"): 2,
+    ("PUT", "/authors/by-email/{email}"): 3,
+    ("DELETE", "/authors/by-email/{email}"): 4,
+    # Categories; writes include a NOTIFY, and listings only query to
+    # reload the in-memory copy
+    ("POST", "/category/"): 3,
+    ("GET", "/category/"): 1,
+    ("GET", "/category/by-name/{name}"): 2,
+    ("PUT", "/category/by-name/{name}"): 4,
+    ("DELETE", "/category/by-name/{name}"): 5,
+    # Courses, as categories
+    ("POST", "/course/"): 3,
+    ("GET", "/course/"): 1,
+    ("GET", "/course/{course_name}"): 2,
+    ("PUT", "/course/{course_name}"): 3,
+    ("DELETE", "/course/{course_name}"): 5,
+    # Books
+    ("POST", "/books/"): 4,
+    ("GET", "/books/"): 1,
+    ("POST", "/books/batch"): 2,
+    # The stream reads its snapshot after the response has started
+    ("GET", "/books/availability/stream"): 0,
+    ("GET", "/books/{book_name}"): 2,
+    ("GET", "/books/{book_name}/recommendations"): 1,
+    # A quantity change locks the book and serves waiting holds first
+    ("PUT", "/books/{book_name}"): 8,
+    ("DELETE", "/books/{book_name}"): 5,
+    # Issued books
+    ("GET", "/issued-books/"): 2,
+    ("GET", "/issued-books/me"): 2,
+    # Includes the book's row lock, taken on the hold and the shelf path
+    ("POST", "/issued-books/"): 6,
+    # Includes a fine INSERT for late returns, and the book lock and second
+    # look at the hold queue when nobody was waiting
+    ("POST", "/issued-books/return"): 11,
+    # Holds
+    ("POST", "/holds/"): 4,
+    ("GET", "/holds/me"): 2,
+    ("DELETE", "/holds/{hold_id}"): 8,
+    # Exports
+    ("GET", "/exports/circulation"): 1,
+}
+
+_query_count = contextvars.ContextVar("query_count", default=None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    # Handlers run in the threadpool with a copy of the request's context, so
+    # they all see (and increment) the same counter object
+    counter = _query_count.get()
+    if counter is not None:
+        counter.count += 1
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL statements each request runs and compare them to
+    ``QUERY_BUDGETS``. Controlled by ``query_budget_mode``:
+
+    - ``off``: nothing is counted; app/main.py doesn't mount the middleware
+    - ``warn``: over-budget requests are logged and every response carries
+      ``X-Query-Count``
+    - ``enforce``: as ``warn``, but an over-budget request, or a route with
+      no budget, gets a 500 instead of its response. Meant for test runs, so
+      an added lazy load or N+1 loop fails the suite.
+    """
+
+    def __init__(self, app, mode: str = None):
+        self.app = app
+        self.mode = mode or settings.query_budget_mode
+        # Only counting apps pay for a listener on every statement
+        if self.mode != "off" and not event.contains(Engine, "before_cursor_execute", _count_query):
+            event.listen(Engine, "before_cursor_execute", _count_query)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        counter = QueryCounter()
+        token = _query_count.set(counter)
+
+        async def checking_send(message):
+            if message["type"] == "http.response.start":
+                violation = self._check(scope, counter.count)
+                if violation and self.mode == "enforce":
+                    response = JSONResponse(status_code=500, content={"detail": violation})
+                    await response(scope, receive, send)
+                    raise _BudgetExceeded
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(counter.count).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, checking_send)
+        except _BudgetExceeded:
+            pass
+        finally:
+            _query_count.reset(token)
+
+    def _check(self, scope, count: int):
+        route = scope.get("route")
+        if route is None:
+            # Unmatched paths and non-API routes such as /docs
+            return None
+        key = (scope["method"], route.path)
+        budget = QUERY_BUDGETS.get(key)
+        if budget is None:
+            violation = f"No query budget declared for {key[0]} {key[1]}"
+        elif count > budget:
+            violation = f"{key[0]} {key[1]} ran {count} queries, budget is {budget}"
+        else:
+            return None
+        logger.warning("Query budget: %s", violation)
+        return violation
+
+
+class _BudgetExceeded(Exception):
+    """Stops the rest of a response that was replaced by a budget error."""
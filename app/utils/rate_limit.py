@@ -0,0 +1,221 @@
+import asyncio
+import math
+import threading
+import time
+
+from starlette.responses import JSONResponse
+
+from app.config import get_settings
+from app.database import pool_limits
+from app.utils.token_cache import token_cache, token_hash
+
+settings = get_settings()
+
+# Tokens charged per request; anything not listed costs 1.
+# Login and registration are dominated by bcrypt, so they are charged more.
+ROUTE_COSTS = {
+    ("POST", "/users/login"): 10,
+    ("POST", "/users/register"): 10,
+    ("PUT", "/users/update-profile"): 5,
+}
+
+# Long-lived streams that hold no database connection; they are rate limited
+# but not counted against max_concurrent_requests
+UNCAPPED_PATHS = {"/books/availability/stream"}
+
+
+class InMemoryBackend:
+    """Token buckets local to this worker process."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    async def consume(self, keys: list, cost: float, capacity: float, rate: float):
+        """
+        Charge ``cost`` to every bucket in ``keys`` if all of them can pay,
+        otherwise to none. Returns ``(allowed, retry_after)``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = {}
+            for key in keys:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels[key] = min(capacity, tokens + (now - updated) * rate)
+            allowed = all(tokens >= cost for tokens in levels.values())
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens - cost if allowed else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, capacity, rate)
+        if allowed:
+            return True, 0
+        return False, max((cost - tokens) / rate for tokens in levels.values())
+
+    def _prune(self, now: float, capacity: float, rate: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        full = [
+            key
+            for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate >= capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+
+class RedisBackend:
+    """
+    Token buckets shared by every worker through Redis (requires ``redis``).
+    All of a request's buckets are checked and charged by one script, so a
+    request refused by one bucket costs the others nothing.
+    """
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local levels = {}
+    local allowed = 1
+    local retry_after = 0
+    for i, key in ipairs(KEYS) do
+        local state = redis.call('HMGET', key, 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + (now - updated) * rate)
+        if tokens < cost then
+            allowed = 0
+            retry_after = math.max(retry_after, (cost - tokens) / rate)
+        end
+        levels[i] = tokens
+    end
+    for i, key in ipairs(KEYS) do
+        local tokens = levels[i]
+        if allowed == 1 then
+            tokens = tokens - cost
+        end
+        redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+    return {allowed, tostring(retry_after)}
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "RATE_LIMIT_REDIS_URL is set but the redis package is not installed; "
+                "install it or unset RATE_LIMIT_REDIS_URL"
+            ) from None
+
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def consume(self, keys: list, cost: float, capacity: float, rate: float):
+        allowed, retry_after = await self._script(
+            keys=[f"ratelimit:{key}" for key in keys], args=[capacity, rate, cost]
+        )
+        if allowed:
+            return True, 0
+        return False, float(retry_after)
+
+
+def _client_keys(scope) -> list:
+    keys = []
+    client = scope.get("client")
+    if client:
+        keys.append(f"ip:{client[0]}")
+
+    # Only tokens this worker has already verified identify a user; trusting
+    # unverified claims would let anyone drain another user's bucket.
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                payload = token_cache.get(token_hash(token))
+                if payload and payload.get("sub"):
+                    keys.append(f"user:{payload['sub']}")
+            break
+    return keys
+
+
+class InFlightRequests:
+    """Count of requests currently inside the application, for load shedding and draining."""
+
+    def __init__(self):
+        self.count = 0
+
+    async def drain(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while self.count:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+
+in_flight = InFlightRequests()
+
+
+class AdmissionControlMiddleware:
+    """
+    Per-IP and per-user token-bucket rate limiting (429) plus a global cap on
+    in-flight requests (503), applied before any handler touches the database.
+    """
+
+    def __init__(self, app, backend=None, max_concurrent: int = None):
+        self.app = app
+        if backend is None:
+            backend = (
+                RedisBackend(settings.rate_limit_redis_url)
+                if settings.rate_limit_redis_url
+                else InMemoryBackend()
+            )
+        self.backend = backend
+        self.max_concurrent = (
+            max_concurrent or settings.max_concurrent_requests or sum(pool_limits())
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cost = ROUTE_COSTS.get((scope["method"], scope["path"]), 1)
+        keys = _client_keys(scope)
+        if keys:
+            allowed, retry_after = await self.backend.consume(
+                keys,
+                cost,
+                settings.rate_limit_capacity,
+                settings.rate_limit_refill_per_second,
+            )
+            if not allowed:
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests"},
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+                await response(scope, receive, send)
+                return
+
+        if scope["path"] in UNCAPPED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if in_flight.count >= self.max_concurrent:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        in_flight.count += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.count -= 1
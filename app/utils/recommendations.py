@@ -0,0 +1,239 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.database import SessionLocal
+from app.utils.background import PeriodicJob
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it the route answers 503
+    np = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Co-occurrence pairs are stored as one int64 key: row << KEY_BITS | column
+KEY_BITS = 31
+KEY_MASK = (1 << KEY_BITS) - 1
+# Incremental refreshes re-read loans this far back to cover transactions
+# that committed late; loans already counted are ignored
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class Recommendation(NamedTuple):
+    title: str
+    author_name: str
+    score: float
+
+
+class _Snapshot(NamedTuple):
+    """Immutable view served to requests; swapped whole after each refresh."""
+
+    index_by_title: Dict[str, int]
+    titles: List[Optional[str]]
+    author_names: List[Optional[str]]
+    neighbours: "np.ndarray"  # int32 [books, k], -1 where a row has fewer than k
+    scores: "np.ndarray"  # float32 [books, k]
+
+
+def _pair_keys(students: "np.ndarray", books: "np.ndarray") -> "np.ndarray":
+    """
+    Every ordered (book, book) pair, the diagonal included, borrowed by the
+    same student. ``students``/``books`` are distinct rows grouped by student.
+    """
+    n = len(students)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    starts = np.flatnonzero(np.r_[True, students[1:] != students[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    group = np.repeat(np.arange(len(starts)), sizes)
+    partners = sizes[group]
+
+    left = np.repeat(np.arange(n), partners)
+    block_start = np.repeat(np.cumsum(partners) - partners, partners)
+    right = np.repeat(starts[group], partners) + (np.arange(len(left)) - block_start)
+    return (books[left].astype(np.int64) << KEY_BITS) | books[right]
+
+
+class RecommendationIndex:
+    """
+    Item-item "borrowed together" index built from ``issued_books``.
+
+    Co-occurrence counts are kept as a sparse, sorted array of pair keys with
+    their counts. New loans are folded in incrementally: for each affected
+    student, the pairs of their book set after the new loans minus the pairs
+    before. The top-k neighbours of every book, by cosine similarity, are
+    precomputed into dense arrays, so a lookup never touches the database.
+    """
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._book_index: Dict[object, int] = {}
+        self._student_books: Dict[object, set] = {}
+        self._keys = None
+        self._counts = None
+        self._watermark: Optional[datetime] = None
+        self._snapshot: Optional[_Snapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def similar(self, title: str, limit: int) -> List[Recommendation]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        row = snapshot.index_by_title.get(title)
+        if row is None:
+            return []
+
+        recommendations = []
+        for column, score in zip(snapshot.neighbours[row], snapshot.scores[row]):
+            if column < 0 or len(recommendations) == limit:
+                break
+            neighbour_title = snapshot.titles[column]
+            if neighbour_title is not None:
+                recommendations.append(
+                    Recommendation(neighbour_title, snapshot.author_names[column], float(score))
+                )
+        return recommendations
+
+    def refresh(self, db: Session) -> int:
+        """Fold loans issued since the last refresh into the index; returns loans read."""
+        with self._lock:
+            stmt = select(models.IssuedBook.student_id, models.IssuedBook.book_id).distinct()
+            started_at = datetime.utcnow()
+            if self._watermark is not None:
+                stmt = stmt.where(models.IssuedBook.issue_date >= self._watermark - REFRESH_OVERLAP)
+            loans = db.execute(stmt).all()
+
+            changed = self._merge(loans)
+            # Titles and author names may change without any new loans
+            labels = self._labels(
+                db.execute(
+                    select(models.Book.id, models.Book.title, models.Book.author_name)
+                ).all()
+            )
+            snapshot = self._snapshot
+            if changed or snapshot is None or len(labels[1]) != len(snapshot.neighbours):
+                self._rebuild(*labels)
+            else:
+                self._snapshot = snapshot._replace(
+                    index_by_title=labels[0], titles=labels[1], author_names=labels[2]
+                )
+            self._watermark = started_at
+            return len(loans)
+
+    def _column(self, book_id) -> int:
+        column = self._book_index.get(book_id)
+        if column is None:
+            column = self._book_index[book_id] = len(self._book_index)
+        return column
+
+    def _merge(self, loans) -> bool:
+        new_books = {}
+        for student_id, book_id in loans:
+            column = self._column(book_id)
+            if column not in self._student_books.get(student_id, ()):
+                new_books.setdefault(student_id, set()).add(column)
+        if not new_books:
+            return False
+
+        before_students, before_books, after_students, after_books = [], [], [], []
+        for position, (student_id, added) in enumerate(new_books.items()):
+            before = self._student_books.setdefault(student_id, set())
+            before_students.extend([position] * len(before))
+            before_books.extend(before)
+            before |= added
+            after_students.extend([position] * len(before))
+            after_books.extend(before)
+
+        added_keys = _pair_keys(
+            np.array(after_students, dtype=np.int64), np.array(after_books, dtype=np.int64)
+        )
+        removed_keys = _pair_keys(
+            np.array(before_students, dtype=np.int64), np.array(before_books, dtype=np.int64)
+        )
+
+        keys = np.concatenate(
+            [k for k in (self._keys, added_keys, removed_keys) if k is not None]
+        )
+        weights = np.concatenate(
+            [
+                w
+                for w in (
+                    self._counts,
+                    np.ones(len(added_keys), dtype=np.int64),
+                    -np.ones(len(removed_keys), dtype=np.int64),
+                )
+                if w is not None
+            ]
+        )
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights).astype(np.int64)
+        nonzero = counts > 0
+        self._keys, self._counts = unique_keys[nonzero], counts[nonzero]
+        return True
+
+    def _labels(self, books):
+        columns = [self._column(book_id) for book_id, _, _ in books]
+        size = len(self._book_index)
+        # Deleted books keep their column with no title and are never served
+        titles, author_names = [None] * size, [None] * size
+        for column, (_, title, author_name) in zip(columns, books):
+            titles[column], author_names[column] = title, author_name
+        index_by_title = {row.title: column for column, row in zip(columns, books)}
+        return index_by_title, titles, author_names
+
+    def _rebuild(self, index_by_title, titles, author_names):
+        size = len(titles)
+        neighbours = np.full((size, self.top_k), -1, dtype=np.int32)
+        scores = np.zeros((size, self.top_k), dtype=np.float32)
+
+        if self._keys is not None and len(self._keys):
+            rows = self._keys >> KEY_BITS
+            columns = self._keys & KEY_MASK
+            diagonal = rows == columns
+            # The diagonal counts the distinct students who borrowed each book
+            popularity = np.zeros(size, dtype=np.float64)
+            popularity[rows[diagonal]] = self._counts[diagonal]
+
+            rows, columns = rows[~diagonal], columns[~diagonal]
+            similarity = self._counts[~diagonal] / np.sqrt(popularity[rows] * popularity[columns])
+
+            order = np.lexsort((columns, -similarity, rows))
+            rows, columns, similarity = rows[order], columns[order], similarity[order]
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+            top = rank < self.top_k
+            neighbours[rows[top], rank[top]] = columns[top]
+            scores[rows[top], rank[top]] = similarity[top]
+
+        self._snapshot = _Snapshot(index_by_title, titles, author_names, neighbours, scores)
+
+
+recommendation_index = RecommendationIndex(settings.recommendation_top_k)
+
+
+def refresh_recommendations():
+    if np is None:
+        return
+    with SessionLocal() as db:
+        loans = recommendation_index.refresh(db)
+    logger.debug("Recommendation index refreshed from %s loans", loans)
+
+
+recommendation_refresh = PeriodicJob(
+    "recommendation-refresh",
+    refresh_recommendations,
+    settings.recommendation_refresh_seconds,
+)
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.config import get_settings
+from app.database import SessionLocal
+from app.utils.notify import notify, pg_listener
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+REFERENCE_DATA_CHANNEL = "reference_data"
+
+
+class ReferenceTable:
+    """
+    Every row of a small table that rarely changes, held in memory as
+    response models so name lookups and listings never query the database.
+
+    A write calls ``changed`` in its transaction; on commit every worker
+    marks the table stale (via NOTIFY, this worker directly) and the next
+    read reloads it from the primary. ``reference_data_max_age_seconds``
+    bounds how stale a worker gets if a notification is missed. If a reload
+    fails, the previous rows keep being served.
+    """
+
+    def __init__(self, name: str, model, schema):
+        self.name = name
+        self.model = model
+        self.schema = schema
+        self._rows = None
+        self._by_name = {}
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def changed(self, db: Session):
+        """Have every worker, this one included, reload the table once ``db`` commits."""
+        notify(db, REFERENCE_DATA_CHANNEL, self.name)
+        # Don't wait for our own notification: the client may use the change next
+        event.listen(db, "after_commit", lambda session: self.invalidate(), once=True)
+
+    def load(self):
+        # Cleared first, so a change notified while loading triggers another load
+        self._stale = False
+        with SessionLocal() as db:
+            rows = [
+                self.schema.model_validate(row, from_attributes=True)
+                for row in db.scalars(select(self.model).order_by(self.model.name))
+            ]
+        self._rows = rows
+        self._by_name = {row.name: row for row in rows}
+        self._loaded_at = time.monotonic()
+
+    def _is_fresh(self) -> bool:
+        age = time.monotonic() - self._loaded_at
+        return not self._stale and age <= settings.reference_data_max_age_seconds
+
+    def _refresh(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            try:
+                self.load()
+            except Exception:
+                self._stale = True
+                if self._rows is None:
+                    raise
+                logger.warning(
+                    "Reloading %s failed; serving the previous rows", self.name, exc_info=True
+                )
+
+    def all(self) -> List:
+        """Every row, ordered by name."""
+        self._refresh()
+        return self._rows
+
+    def get(self, name: str) -> Optional[object]:
+        self._refresh()
+        return self._by_name.get(name)
+
+
+categories = ReferenceTable("categories", models.Category, schemas.CategoryResponse)
+courses = ReferenceTable("courses", models.Course, schemas.CourseResponse)
+REFERENCE_TABLES: Dict[str, ReferenceTable] = {
+    table.name: table for table in (categories, courses)
+}
+
+
+def load_reference_data():
+    for table in REFERENCE_TABLES.values():
+        table.load()
+
+
+def _on_change(payload: str):
+    table = REFERENCE_TABLES.get(payload)
+    if table is not None:
+        table.invalidate()
+
+
+pg_listener.subscribe(REFERENCE_DATA_CHANNEL, _on_change)
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.config import get_settings
+from app.utils.circuit_breaker import db_breaker
+from app.utils.token_cache import revocation_list, token_hash
+
+settings = get_settings()
+
+# Read-only catalog GETs whose responses are the same for every caller
+# allowed to make them, by route path: True for routes open to anonymous
+# callers, False for routes any signed-in user may call. Routes that check
+# the caller's role are left out, so their responses are never replayed.
+CATALOG_ROUTES = {
+    "/authors/": True,
+    "/books/": True,
+    "/category/": True,
+    "/course/": True,
+    "/books/{book_name}": False,
+    "/course/{course_name}": False,
+}
+STALE_WARNING = b'110 - "Response is Stale"'
+
+
+class _Entry(NamedTuple):
+    headers: list
+    body: bytes
+    stored_at: float
+    public: bool
+
+
+class StaleCache:
+    """Bounded LRU of the last successful response per catalog URL."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry: _Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+stale_cache = StaleCache(settings.stale_cache_size)
+
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _authorized(scope) -> bool:
+    """
+    A valid bearer token, checked without the database: the revocation list
+    can only be confirmed against its table, so a possible hit is refused.
+    """
+    # Imported here so importing app.main never loads auth (see lazy_routers)
+    from app.auth import decode_token
+
+    authorization = (_header(scope, b"authorization") or b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    key = token_hash(token)
+    return decode_token(token, key) is not None and not revocation_list.might_be_revoked(key)
+
+
+class StaleCatalogMiddleware:
+    """
+    Keep the last 200 response of each catalog GET and, while the database
+    circuit breaker is open, answer with it (marked stale) instead of a 503.
+
+    The route is only known once the router has matched it, so responses
+    are stored after the fact, and only for ``CATALOG_ROUTES``; a stored
+    entry remembers whether its route needs a signed-in caller.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["path"], scope["query_string"], _header(scope, b"accept"))
+        if db_breaker.is_open:
+            entry = stale_cache.get(key)
+            if entry is not None and (entry.public or _authorized(scope)):
+                age = str(int(time.time() - entry.stored_at)).encode()
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 200,
+                        "headers": entry.headers + [(b"warning", STALE_WARNING), (b"age", age)],
+                    }
+                )
+                await send({"type": "http.response.body", "body": entry.body})
+                return
+
+        headers = None
+        public = None
+        chunks = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal headers, public, size
+            if message["type"] == "http.response.start":
+                # The router sets scope["route"] on this same scope dict
+                route = scope.get("route")
+                public = CATALOG_ROUTES.get(getattr(route, "path", None))
+                if message["status"] == 200 and public is not None:
+                    headers = [
+                        (name, value)
+                        for name, value in message.get("headers", [])
+                        if name != b"set-cookie"
+                    ]
+            elif message["type"] == "http.response.body" and headers is not None:
+                body = message.get("body", b"")
+                size += len(body)
+                if size > settings.stale_cache_max_body_bytes:
+                    headers = None
+                    chunks.clear()
+                else:
+                    chunks.append(body)
+                    if not message.get("more_body", False):
+                        stale_cache.put(
+                            key, _Entry(headers, b"".join(chunks), time.time(), public)
+                        )
+            await send(message)
+
+        await self.app(scope, receive, capture_send)
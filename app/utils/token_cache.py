@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.database import SessionLocal
+from app.utils.background import PeriodicJob
+
+settings = get_settings()
+
+# Rebuild the filter (dropping expired entries) this often
+REVOCATION_REBUILD_SECONDS = 3600
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Bounded LRU of verified JWT payloads keyed by token hash; honours ``exp``."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key: str, payload: dict):
+        expires = payload.get("exp")
+        if expires is None:
+            return
+        with self._lock:
+            self._entries[key] = (payload, float(expires))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class BloomFilter:
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str):
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationList:
+    """
+    Revoked token hashes, persisted in ``revoked_tokens`` and mirrored into an
+    in-memory Bloom filter. Each worker pulls rows revoked by other workers
+    every ``revocation_sync_seconds``; a filter hit is confirmed against the
+    table so false positives never reject a valid token.
+    """
+
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self._filter = BloomFilter(bits, hashes)
+        self._synced_until = None
+        self._rebuilt_at = 0.0
+        self._lock = threading.Lock()
+
+    def might_be_revoked(self, key: str) -> bool:
+        return key in self._filter
+
+    def is_revoked(self, db: Session, key: str) -> bool:
+        if not self.might_be_revoked(key):
+            return False
+        return db.get(models.RevokedToken, key) is not None
+
+    def revoke(self, db: Session, key: str, expires_at: datetime):
+        db.execute(
+            pg_insert(models.RevokedToken)
+            .values(token_hash=key, expires_at=expires_at, revoked_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=[models.RevokedToken.token_hash])
+        )
+        db.commit()
+        self._filter.add(key)
+
+    def sync(self, db: Session):
+        with self._lock:
+            if time.monotonic() - self._rebuilt_at > REVOCATION_REBUILD_SECONDS:
+                self._rebuild(db)
+                return
+
+            stmt = select(models.RevokedToken.token_hash, models.RevokedToken.revoked_at)
+            if self._synced_until is not None:
+                # Overlap the previous window to tolerate clock skew between workers
+                since = self._synced_until - timedelta(seconds=settings.revocation_sync_seconds)
+                stmt = stmt.where(models.RevokedToken.revoked_at >= since)
+            for key, revoked_at in db.execute(stmt):
+                self._filter.add(key)
+                if self._synced_until is None or revoked_at > self._synced_until:
+                    self._synced_until = revoked_at
+
+    def _rebuild(self, db: Session):
+        now = datetime.utcnow()
+        db.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at < now))
+        db.commit()
+
+        fresh = BloomFilter(self.bits, self.hashes)
+        synced_until = None
+        stmt = select(models.RevokedToken.token_hash, models.RevokedToken.revoked_at)
+        for key, revoked_at in db.execute(stmt):
+            fresh.add(key)
+            if synced_until is None or revoked_at > synced_until:
+                synced_until = revoked_at
+
+        self._filter = fresh
+        self._synced_until = synced_until
+        self._rebuilt_at = time.monotonic()
+
+
+token_cache = TokenCache(settings.token_cache_size)
+revocation_list = RevocationList(
+    settings.revocation_bloom_bits, settings.revocation_bloom_hashes
+)
+
+
+def sync_revocation_list():
+    with SessionLocal() as db:
+        revocation_list.sync(db)
+
+
+revocation_sync = PeriodicJob(
+    "revocation-sync", sync_revocation_list, settings.revocation_sync_seconds
+)
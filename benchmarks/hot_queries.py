@@ -0,0 +1,101 @@
+"""
+Per-call cost of the hot lookups in app/queries.py against the
+``db.query(...)`` chains they replaced.
+
+Runs on an in-memory SQLite database, so nearly all of the time measured is
+SQLAlchemy's own Python work: building the statement, looking up its
+compiled form and loading the row.
+
+    python -m benchmarks.hot_queries [--calls 20000]
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import models, queries
+from app.database import Base
+
+
+def _seed(db: Session):
+    author = models.Author(name="Author", email="author@example.com")
+    category = models.Category(name="Category", description="")
+    user = models.User(
+        name="student", email="student@example.com", password="", role=models.UserRoleEnum.STUDENT
+    )
+    db.add_all([author, category, user])
+    db.flush()
+    book = models.Book(title="Title", quantity=1, author_id=author.id, category_id=category.id)
+    db.add(book)
+    db.flush()
+    db.add(
+        models.IssuedBook(
+            id=uuid.uuid4(),
+            student_id=user.id,
+            book_id=book.id,
+            issue_date=datetime.utcnow(),
+            due_date=datetime.utcnow(),
+            is_returned=False,
+        )
+    )
+    db.commit()
+    return user, book
+
+
+def _per_call_us(func, calls: int) -> float:
+    func()  # the first call analyses the lambda and compiles the SQL
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        user, book = _seed(db)
+        cases = {
+            "user by email": (
+                lambda: db.query(models.User).filter(models.User.email == user.email).first(),
+                lambda: queries.user_by_email(db, user.email),
+            ),
+            "book by title": (
+                lambda: db.query(models.Book).filter(models.Book.title == book.title).first(),
+                lambda: queries.book_by_title(db, book.title),
+            ),
+            "author by name": (
+                lambda: db.query(models.Author)
+                .filter(models.Author.name == "Author")
+                .first(),
+                lambda: queries.author_by_name(db, "Author"),
+            ),
+            "latest loan": (
+                lambda: db.query(models.IssuedBook)
+                .filter(
+                    models.IssuedBook.book_id == book.id,
+                    models.IssuedBook.student_id == user.id,
+                )
+                .order_by(models.IssuedBook.issue_date.desc())
+                .first(),
+                lambda: queries.latest_loan(db, book.id, user.id),
+            ),
+        }
+        print(f"{'query':<16}{'db.query':>12}{'lambda_stmt':>14}{'saved':>8}")
+        for name, (chained, cached) in cases.items():
+            before = _per_call_us(chained, args.calls)
+            after = _per_call_us(cached, args.calls)
+            print(
+                f"{name:<16}{before:>10.1f}us{after:>12.1f}us{1 - after / before:>8.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
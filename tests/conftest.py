@@ -0,0 +1,146 @@
+"""
+Fixtures for the API tests.
+
+The tests run the app in-process against a throwaway SQLite file, so
+PostgreSQL-only behaviour (row locks, partial indexes, partitions) is not
+exercised. app.config reads the environment once, so it is set here before
+anything imports the app.
+"""
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-not-for-production")
+os.environ.setdefault("RATE_LIMIT_CAPACITY", "100000")
+# Mounts QueryBudgetMiddleware (off in production), which counts each
+# request's statements for CountingClient
+os.environ["QUERY_BUDGET_MODE"] = "warn"
+# Routers are mounted at import; the tests don't run the lifespan
+os.environ["LAZY_ROUTERS"] = "false"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import database, models  # noqa: E402
+from app.auth import Hash, create_access_token  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.reference_data import REFERENCE_TABLES  # noqa: E402
+
+PASSWORD = "pw123456"
+
+
+class CountingClient(TestClient):
+    """
+    A TestClient that sets ``response.query_count``: the SQL statements the
+    request ran before its response started, from the X-Query-Count header
+    QueryBudgetMiddleware adds in warn mode.
+    """
+
+    def request(self, *args, **kwargs):
+        response = super().request(*args, **kwargs)
+        response.query_count = int(response.headers["x-query-count"])
+        return response
+
+
+@pytest.fixture(scope="session")
+def engine():
+    engine = database.get_engine()
+
+    @event.listens_for(engine, "connect")
+    def _add_pg_notify(dbapi_connection, connection_record):
+        # Availability and reference data changes NOTIFY the workers; a no-op here
+        dbapi_connection.create_function("pg_notify", 2, lambda channel, payload: None)
+
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    """A session on an empty schema, dropped after the test."""
+    database.Base.metadata.create_all(engine)
+    for table in REFERENCE_TABLES.values():
+        table.invalidate()
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        database.Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def client(db):
+    return CountingClient(app)
+
+
+@pytest.fixture(scope="session")
+def password_hash():
+    return Hash.hash_password(PASSWORD)
+
+
+def auth_headers(email: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+@pytest.fixture
+def library(db, password_hash):
+    """
+    A small library: an admin, three students, an author with books and
+    one without, a category and course in use and unused ones.
+
+    ``stu`` has an overdue loan of T1; Out has no copies and ``reader``
+    waiting for it; T2 and the unused rows can be deleted.
+    """
+    users = {
+        name: models.User(
+            name=name, email=f"{name}@example.com", password=password_hash, role=role
+        )
+        for name, role in (
+            ("adm", models.UserRoleEnum.ADMIN),
+            ("stu", models.UserRoleEnum.STUDENT),
+            ("reader", models.UserRoleEnum.STUDENT),
+            ("leaver", models.UserRoleEnum.STUDENT),
+        )
+    }
+    author = models.Author(name="Ann", email="ann@example.com")
+    unused_author = models.Author(name="Orphan", email="orphan@example.com")
+    category = models.Category(name="Fiction", description="Novels")
+    unused_category = models.Category(name="Empty", description="Nothing yet")
+    course = models.Course(name="CS", description="Computing", year=models.YearEnum.FIRST)
+    db.add_all([*users.values(), author, unused_author, category, unused_category, course])
+    db.flush()
+
+    books = {
+        title: models.Book(
+            title=title, quantity=quantity, author_id=author.id, category_id=category.id
+        )
+        for title, quantity in (("T1", 1), ("T2", 1), ("Out", 0))
+    }
+    db.add_all(books.values())
+    db.flush()
+
+    now = datetime.utcnow()
+    db.add(
+        models.IssuedBook(
+            id=uuid.uuid4(),
+            student_id=users["stu"].id,
+            book_id=books["T1"].id,
+            issue_date=now - timedelta(days=30),
+            due_date=now - timedelta(days=16),
+            is_returned=False,
+        )
+    )
+    hold = models.BookHold(student_id=users["reader"].id, book_id=books["Out"].id)
+    db.add(hold)
+    db.commit()
+
+    return SimpleNamespace(
+        users=users,
+        books=books,
+        hold=hold,
+        headers={name: auth_headers(user.email) for name, user in users.items()},
+    )
@@ -0,0 +1,93 @@
+from typing import NamedTuple, Optional
+
+import pytest
+
+from .conftest import PASSWORD
+
+
+class Create(NamedTuple):
+    url: str
+    body: dict
+    user: Optional[str]
+    status: int
+    queries: int
+
+
+# Each create is a single INSERT ... ON CONFLICT DO NOTHING RETURNING, plus
+# the current user's SELECT where the route needs one. A duplicate runs the
+# same INSERT and gets a 400 from its empty RETURNING.
+CREATES = {
+    "register": Create(
+        "/users/register",
+        {"name": "new", "email": "new@example.com", "password": PASSWORD},
+        None,
+        200,
+        1,
+    ),
+    "register duplicate": Create(
+        "/users/register",
+        {"name": "stu", "email": "stu@example.com", "password": PASSWORD},
+        None,
+        400,
+        1,
+    ),
+    "author": Create(
+        "/authors/", {"name": "Bob", "email": "bob@example.com", "nationality": None}, "adm", 201, 2
+    ),
+    "author duplicate": Create(
+        "/authors/", {"name": "Ann", "email": "ann@example.com", "nationality": None}, "adm", 400, 2
+    ),
+    # A new category or course also NOTIFYs the workers' in-memory copies;
+    # nothing is written for a duplicate
+    "category": Create("/category/", {"name": "Science", "description": "d"}, "adm", 201, 3),
+    "category duplicate": Create("/category/", {"name": "Fiction", "description": "d"}, "adm", 400, 2),
+    "course": Create("/course/", {"name": "Maths", "description": "d", "year": 1}, "adm", 201, 3),
+    "course duplicate": Create("/course/", {"name": "CS", "description": "d", "year": 1}, "adm", 400, 2),
+    # Plus the author lookup and the first load of the in-memory categories
+    "book": Create(
+        "/books/",
+        {
+            "title": "T9",
+            "publication_date": None,
+            "quantity": 1,
+            "author_name": "Ann",
+            "category_name": "Fiction",
+        },
+        "adm",
+        201,
+        4,
+    ),
+    "book duplicate": Create(
+        "/books/",
+        {
+            "title": "T1",
+            "publication_date": None,
+            "quantity": 1,
+            "author_name": "Ann",
+            "category_name": "Fiction",
+        },
+        "adm",
+        400,
+        4,
+    ),
+    # Plus the book's row lock, the ready-hold and copy UPDATEs and the
+    # availability NOTIFY; the loan is an INSERT ... SELECT that skips an open
+    # loan of the book
+    "issue": Create("/issued-books/", {"student_name": "stu", "book_title": "T2"}, "stu", 201, 6),
+    "issue already on loan": Create(
+        "/issued-books/", {"student_name": "stu", "book_title": "T1"}, "stu", 400, 6
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CREATES)
+def test_create_query_count(client, library, name):
+    create = CREATES[name]
+    response = client.post(
+        create.url,
+        json=create.body,
+        headers=library.headers[create.user] if create.user else None,
+    )
+
+    assert response.status_code == create.status, response.text
+    assert response.query_count == create.queries
@@ -0,0 +1,26 @@
+import io
+
+import pytest
+
+from app.utils import export
+
+URL = "/exports/circulation?start=2020-01-01&format=parquet"
+
+
+def test_parquet_export_has_every_loan(client, library):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    response = client.get(URL, headers=library.headers["adm"])
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 1
+
+
+def test_parquet_export_without_pyarrow_is_not_acceptable(client, library, monkeypatch):
+    monkeypatch.setattr(export, "pq", None)
+
+    response = client.get(URL, headers=library.headers["adm"])
+
+    assert response.status_code == 406
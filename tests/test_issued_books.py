@@ -0,0 +1,56 @@
+import io
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+
+
+def _add_returned_loans(db, library, count):
+    now = datetime.utcnow()
+    db.add_all(
+        models.IssuedBook(
+            id=uuid.uuid4(),
+            student_id=library.users["reader"].id,
+            book_id=library.books["T2"].id,
+            issue_date=now - timedelta(days=100 + day),
+            due_date=now - timedelta(days=86 + day),
+            return_date=now - timedelta(days=90 + day),
+            is_returned=True,
+        )
+        for day in range(count)
+    )
+    db.commit()
+
+
+def test_all_issued_books_are_listed_without_a_limit(client, library, db):
+    _add_returned_loans(db, library, 6)
+
+    response = client.get("/issued-books/", headers=library.headers["adm"])
+
+    assert response.status_code == 200
+    assert len(response.json()) == 7
+
+
+def test_issued_books_page_with_limit_and_offset(client, library, db):
+    _add_returned_loans(db, library, 6)
+    headers = library.headers["adm"]
+
+    everything = client.get("/issued-books/", headers=headers).json()
+    page = client.get("/issued-books/?limit=2&offset=5", headers=headers).json()
+
+    assert page == everything[5:7]
+
+
+def test_issued_books_stream_as_msgpack(client, library, db):
+    msgpack = pytest.importorskip("msgpack")
+    _add_returned_loans(db, library, 6)
+
+    response = client.get(
+        "/issued-books/",
+        headers={**library.headers["adm"], "Accept": "application/msgpack"},
+    )
+
+    assert response.status_code == 200
+    assert len(list(msgpack.Unpacker(io.BytesIO(response.content)))) == 7
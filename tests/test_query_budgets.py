@@ -0,0 +1,165 @@
+from typing import NamedTuple, Optional
+
+import pytest
+from fastapi.routing import APIRoute
+
+from app.config import Settings
+from app.main import app
+from app.utils.query_budget import QUERY_BUDGETS
+
+from .conftest import PASSWORD
+
+
+class Call(NamedTuple):
+    """A request that takes a route down its most expensive path in ``library``."""
+
+    url: str
+    body: Optional[dict] = None
+    user: Optional[str] = "adm"
+    status: int = 200
+
+
+CALLS = {
+    ("GET", "/"): Call("/", user=None),
+    # Users
+    ("POST", "/users/register"): Call(
+        "/users/register", {"name": "new", "email": "new@example.com", "password": PASSWORD}, None
+    ),
+    ("GET", "/users/all"): Call("/users/all"),
+    ("POST", "/users/batch"): Call("/users/batch", {"ids": ["{stu_id}"]}),
+    ("GET", "/users/{user_id}/loans"): Call("/users/{stu_id}/loans"),
+    ("POST", "/users/login"): Call(
+        "/users/login", {"email": "stu@example.com", "password": PASSWORD}, None
+    ),
+    ("PUT", "/users/update-profile"): Call(
+        "/users/update-profile", {"name": "stu", "password": PASSWORD, "mobile_number": None}, "stu"
+    ),
+    ("DELETE", "/users/delete-profile"): Call("/users/delete-profile", user="leaver"),
+    ("POST", "/users/logout"): Call("/users/logout", user="leaver"),
+    # Authors
+    ("POST", "/authors/"): Call(
+        "/authors/", {"name": "Bob", "email": "bob@example.com", "nationality": None}, status=201
+    ),
+    ("GET", "/authors/"): Call("/authors/", user=None),
+    ("GET", "/authors/by-email/{email}"): Call("/authors/by-email/ann@example.com"),
+    ("POST", "/authors/batch"): Call("/authors/batch", {"emails": ["ann@example.com"]}),
+    ("PUT", "/authors/by-email/{email}"): Call(
+        "/authors/by-email/ann@example.com",
+        {"name": "Anna", "email": "ann@example.com", "nationality": None},
+    ),
+    ("DELETE", "/authors/by-email/{email}"): Call("/authors/by-email/orphan@example.com", status=204),
+    # Categories
+    ("POST", "/category/"): Call("/category/", {"name": "Science", "description": "d"}, status=201),
+    ("GET", "/category/"): Call("/category/", user=None),
+    ("GET", "/category/by-name/{name}"): Call("/category/by-name/Fiction"),
+    ("PUT", "/category/by-name/{name}"): Call(
+        "/category/by-name/Fiction", {"name": "Fiction", "description": "Stories"}
+    ),
+    ("DELETE", "/category/by-name/{name}"): Call("/category/by-name/Empty", status=204),
+    # Courses
+    ("POST", "/course/"): Call(
+        "/course/", {"name": "Maths", "description": "d", "year": 1}, status=201
+    ),
+    ("GET", "/course/"): Call("/course/", user=None),
+    ("GET", "/course/{course_name}"): Call("/course/CS", user="stu"),
+    ("PUT", "/course/{course_name}"): Call(
+        "/course/CS", {"name": "CS", "description": "Computer science", "year": 2}
+    ),
+    ("DELETE", "/course/{course_name}"): Call("/course/CS"),
+    # Books
+    ("POST", "/books/"): Call(
+        "/books/",
+        {
+            "title": "T9",
+            "publication_date": None,
+            "quantity": 1,
+            "author_name": "Ann",
+            "category_name": "Fiction",
+        },
+        status=201,
+    ),
+    ("GET", "/books/"): Call("/books/", user=None),
+    ("POST", "/books/batch"): Call("/books/batch", {"titles": ["T1", "T2"]}),
+    ("GET", "/books/{book_name}"): Call("/books/T1", user="stu"),
+    # The recommendation index is built by a job that only the lifespan starts
+    ("GET", "/books/{book_name}/recommendations"): Call(
+        "/books/T1/recommendations", user="stu", status=503
+    ),
+    # A new copy goes to the waiting hold
+    ("PUT", "/books/{book_name}"): Call(
+        "/books/Out",
+        {
+            "title": None,
+            "publication_date": None,
+            "quantity": 1,
+            "author_name": None,
+            "category_name": None,
+        },
+    ),
+    ("DELETE", "/books/{book_name}"): Call("/books/T2"),
+    # Issued books
+    ("GET", "/issued-books/"): Call("/issued-books/"),
+    ("GET", "/issued-books/me"): Call("/issued-books/me", user="stu"),
+    ("POST", "/issued-books/"): Call(
+        "/issued-books/", {"student_name": "stu", "book_title": "T2"}, "stu", 201
+    ),
+    # Overdue, so a fine is recorded
+    ("POST", "/issued-books/return"): Call("/issued-books/return", {"book_title": "T1"}, "stu"),
+    # Holds
+    ("POST", "/holds/"): Call("/holds/", {"book_title": "Out"}, "stu", 201),
+    ("GET", "/holds/me"): Call("/holds/me", user="reader"),
+    ("DELETE", "/holds/{hold_id}"): Call("/holds/{hold_id}", user="reader", status=204),
+    # Exports
+    ("GET", "/exports/circulation"): Call("/exports/circulation?start=2020-01-01"),
+}
+
+# Routes whose queries all run after the response has started
+STREAMED = {("GET", "/books/availability/stream")}
+
+
+def _fill(value, ids: dict):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, list):
+        return [_fill(item, ids) for item in value]
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    return value
+
+
+@pytest.mark.parametrize(
+    "method, path",
+    [key for key in QUERY_BUDGETS if key not in STREAMED],
+    ids=lambda value: value,
+)
+def test_route_stays_within_query_budget(client, library, method, path):
+    call = CALLS[method, path]
+    ids = {"stu_id": str(library.users["stu"].id), "hold_id": str(library.hold.id)}
+    response = client.request(
+        method,
+        _fill(call.url, ids),
+        json=_fill(call.body, ids),
+        headers=library.headers[call.user] if call.user else None,
+    )
+
+    assert response.status_code == call.status, response.text
+    budget = QUERY_BUDGETS[method, path]
+    assert response.query_count <= budget, (
+        f"{method} {path} ran {response.query_count} queries, budget is {budget}"
+    )
+
+
+def test_every_route_has_a_query_budget():
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    assert routes - set(QUERY_BUDGETS) == set()
+    assert set(QUERY_BUDGETS) - routes == set()
+
+
+def test_query_budgets_are_not_counted_by_default():
+    # app/main.py only mounts QueryBudgetMiddleware when the mode isn't "off"
+    assert Settings.model_fields["query_budget_mode"].default == "off"
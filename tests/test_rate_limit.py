@@ -0,0 +1,13 @@
+import sys
+
+import pytest
+
+from app.utils.rate_limit import RedisBackend
+
+
+def test_redis_backend_without_redis_is_a_configuration_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", None)
+    monkeypatch.setitem(sys.modules, "redis.asyncio", None)
+
+    with pytest.raises(RuntimeError, match="RATE_LIMIT_REDIS_URL"):
+        RedisBackend("redis://localhost:6379/0")
@@ -0,0 +1,58 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import models, queries
+
+
+def _return_t1(client, library):
+    return client.post(
+        "/issued-books/return", json={"book_title": "T1"}, headers=library.headers["stu"]
+    )
+
+
+def _quantity_and_fines(db, library):
+    db.expire_all()
+    quantity = db.get(models.Book, library.books["T1"].id).quantity
+    fines = db.scalar(select(func.count()).select_from(models.Fine))
+    return quantity, fines
+
+
+def test_return_puts_the_copy_back_once(client, library, db):
+    first = _return_t1(client, library)
+    assert first.status_code == 200
+    assert first.json()["is_returned"] is True
+    assert first.json()["return_date"] is not None
+    assert _quantity_and_fines(db, library) == (2, 1)
+
+    second = _return_t1(client, library)
+
+    assert second.status_code == 200
+    assert second.json()["message"].startswith("'T1' was already returned")
+    assert _quantity_and_fines(db, library) == (2, 1)
+
+
+def test_return_racing_another_puts_the_copy_back_once(client, library, db, monkeypatch):
+    assert _return_t1(client, library).status_code == 200
+    latest_loan = queries.latest_loan
+
+    def loan_read_before_the_first_return_committed(*args):
+        loan = latest_loan(*args)
+        set_committed_value(loan, "is_returned", False)
+        set_committed_value(loan, "return_date", None)
+        return loan
+
+    monkeypatch.setattr(queries, "latest_loan", loan_read_before_the_first_return_committed)
+    second = _return_t1(client, library)
+
+    assert second.status_code == 200
+    assert second.json()["message"].startswith("'T1' was already returned")
+    assert _quantity_and_fines(db, library) == (2, 1)
+
+
+def test_late_return_fine_is_linked_to_its_loan(client, library, db):
+    assert _return_t1(client, library).status_code == 200
+
+    db.expire_all()
+    fine = db.scalars(select(models.Fine)).one()
+    assert fine.issued_book.book_id == library.books["T1"].id
+    assert fine.issued_book.fine is fine
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def checkouts(engine):
+    """Counts the pooled connections checked out while the test runs."""
+    count = []
+
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        count.append(connection_record)
+
+    event.listen(engine, "checkout", _checkout)
+    yield count
+    event.remove(engine, "checkout", _checkout)
+
+
+# Without replicas the read session is the primary's, shared with get_current_user
+@pytest.mark.parametrize("url", ["/issued-books/me", "/holds/me", "/course/CS"])
+def test_authenticated_read_holds_one_connection(client, library, checkouts, url):
+    response = client.get(url, headers=library.headers["stu"])
+
+    assert response.status_code == 200, response.text
+    assert len(checkouts) == 1
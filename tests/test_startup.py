@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+# Cumulative seconds `import app.main` may take in a fresh interpreter
+COLD_START_BUDGET = 3.0
+
+# Loaded by the lifespan or by the routes that use them, never by the import
+DEFERRED = (
+    "numpy",
+    "pyarrow",
+    "app.auth",
+    "app.routers",
+    "app.utils.availability",
+    "app.utils.export",
+    "app.utils.holds",
+    "app.utils.recommendations",
+)
+
+
+def _import_app():
+    """Import app.main in a new interpreter; return its modules and import times."""
+    env = {**os.environ, "LAZY_ROUTERS": "true"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import sys, app.main; print(*sys.modules)"],
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(result.stdout.split()), result.stderr
+
+
+def _cumulative_seconds(importtime_log: str, module: str) -> float:
+    # Lines read "import time: <self us> | <cumulative us> | <indented module>"
+    for line in importtime_log.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1_000_000
+    raise AssertionError(f"{module} not in the -X importtime output")
+
+
+def test_import_defers_jobs_and_routers():
+    modules, _ = _import_app()
+
+    assert "app.main" in modules
+    assert modules.isdisjoint(DEFERRED), sorted(modules & set(DEFERRED))
+
+
+def test_import_stays_within_cold_start_budget():
+    _, importtime_log = _import_app()
+
+    seconds = _cumulative_seconds(importtime_log, "app.main")
+    assert seconds <= COLD_START_BUDGET, (
+        f"import app.main took {seconds:.2f}s, budget is {COLD_START_BUDGET}s"
+    )